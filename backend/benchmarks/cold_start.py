@@ -0,0 +1,65 @@
+"""
+Cold-start comparison: building the system prompt with and without the resource snapshot
+Each run is a fresh interpreter importing context and rendering the static prompt,
+which is what the first request after a Lambda cold start pays for.
+
+Usage (from backend/): python -m benchmarks.cold_start [--runs 10]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from resources import SNAPSHOT_FILE, build_snapshot
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import context
+context.static_prompt()
+elapsed = time.perf_counter() - start
+print(f"{elapsed * 1000:.2f} {'pypdf' in sys.modules}")
+"""
+
+
+def measure(workdir: str, runs: int) -> tuple[list[float], bool]:
+    timings = []
+    pypdf_loaded = False
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", PROBE], cwd=workdir, capture_output=True, text=True, check=True)
+        elapsed_ms, loaded = result.stdout.split()
+        timings.append(float(elapsed_ms))
+        pypdf_loaded = loaded == "True"
+    return timings, pypdf_loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory(prefix="twin-cold-") as tmp:
+        live_dir = os.path.join(tmp, "live")
+        snapshot_dir = os.path.join(tmp, "snapshot")
+        for target in (live_dir, snapshot_dir):
+            shutil.copytree(os.path.join(backend_dir, "data"), os.path.join(target, "data"), ignore=shutil.ignore_patterns(SNAPSHOT_FILE))
+            for module in ("context.py", "resources.py"):
+                shutil.copy2(os.path.join(backend_dir, module), target)
+        build_snapshot(os.path.join(backend_dir, "data"), os.path.join(snapshot_dir, "data", SNAPSHOT_FILE))
+        os.remove(os.path.join(snapshot_dir, "data", "linkedin.pdf"))
+
+        for label, workdir in (("live parsing", live_dir), ("snapshot", snapshot_dir)):
+            timings, pypdf_loaded = measure(workdir, args.runs)
+            print(
+                f"{label:>13}: median {statistics.median(timings):7.2f} ms  "
+                f"min {min(timings):7.2f} ms  pypdf imported: {pypdf_loaded}"
+            )
+
+
+if __name__ == "__main__":
+    main()
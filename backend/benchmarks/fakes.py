@@ -0,0 +1,165 @@
+"""
+Local stand-ins for the Bedrock runtime, S3 and DynamoDB clients used by the benchmarks
+"""
+
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+class FakeBedrock:
+    """
+    Bedrock runtime client with a fixed reply, latency and token usage.
+    latency is the time to the first token (the whole call for converse), with
+    up to +/- jitter as a fraction of it. Streams send chunk_size characters
+    per event, chunk_delay seconds apart. With total_tokens=None, usage is
+    estimated from the request and reply text like the backend does.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        reply: str = "Bonjour! Je suis le jumeau numérique.",
+        total_tokens: int | None = 1500,
+        jitter: float = 0.0,
+        chunk_size: int = 16,
+        chunk_delay: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.reply = reply
+        self.total_tokens = total_tokens
+        self.jitter = jitter
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency * (1 + self.jitter * (2 * self._random.random() - 1))
+        time.sleep(max(0.0, delay))
+
+    def _usage(self, request: dict) -> dict:
+        output_tokens = max(1, len(self.reply) // 4)
+        if self.total_tokens is None:
+            text = [block.get("text", "") for block in request.get("system", [])]
+            text += [block.get("text", "") for message in request.get("messages", []) for block in message["content"]]
+            input_tokens = sum(len(t) for t in text) // 4 + 1
+        else:
+            input_tokens = self.total_tokens - output_tokens
+        return {
+            "inputTokens": input_tokens,
+            "outputTokens": output_tokens,
+            "totalTokens": input_tokens + output_tokens,
+        }
+
+    def converse(self, **kwargs) -> dict:
+        self._start()
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": self.reply}]}},
+            "stopReason": "end_turn",
+            "usage": self._usage(kwargs),
+        }
+
+    def converse_stream(self, **kwargs) -> dict:
+        self._start()
+        return {"stream": self._events(kwargs)}
+
+    def _events(self, request: dict):
+        yield {"messageStart": {"role": "assistant"}}
+        for i in range(0, len(self.reply), self.chunk_size):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield {"contentBlockDelta": {"delta": {"text": self.reply[i:i + self.chunk_size]}, "contentBlockIndex": 0}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        yield {"metadata": {"usage": self._usage(request)}}
+
+
+class FakeS3:
+    """In-memory S3 client supporting the object calls made by the backend"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        time.sleep(self.latency)
+        with self._lock:
+            body = self.objects.get((Bucket, Key))
+        if body is None:
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": "Not found"}}, "GetObject")
+        return {"Body": _Body(body)}
+
+    def put_object(self, Bucket: str, Key: str, Body, **kwargs) -> dict:
+        time.sleep(self.latency)
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        with self._lock:
+            if kwargs.get("IfNoneMatch") == "*" and (Bucket, Key) in self.objects:
+                raise ClientError({"Error": {"Code": "PreconditionFailed", "Message": "Object exists"}}, "PutObject")
+            self.objects[(Bucket, Key)] = Body
+        return {}
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs) -> dict:
+        time.sleep(self.latency)
+        with self._lock:
+            for obj in Delete["Objects"]:
+                self.objects.pop((Bucket, obj["Key"]), None)
+        return {}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", **kwargs) -> dict:
+        time.sleep(self.latency)
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {"Contents": [{"Key": key} for key in keys], "KeyCount": len(keys), "IsTruncated": False}
+
+    def get_paginator(self, operation: str):
+        return _Paginator(getattr(self, operation))
+
+
+class _Paginator:
+    def __init__(self, operation):
+        self._operation = operation
+
+    def paginate(self, **kwargs):
+        yield self._operation(**kwargs)
+
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+class FakeDynamoDB:
+    """In-memory DynamoDB client supporting the atomic counter update used by the limiter"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.items: dict[str, dict] = {}
+        # Negative updates, i.e. leased tokens handed back
+        self.give_backs = 0
+        self._lock = threading.Lock()
+
+    def update_item(self, TableName: str, Key: dict, ExpressionAttributeValues: dict, **kwargs) -> dict:
+        time.sleep(self.latency)
+        pk = Key["pk"]["S"]
+        amount = int(ExpressionAttributeValues[":amount"]["N"])
+        with self._lock:
+            item = self.items.setdefault(pk, {"value": 0, "expires_at": int(ExpressionAttributeValues[":expires"]["N"])})
+            item["value"] += amount
+            self.give_backs += amount < 0
+            value = item["value"]
+        return {"Attributes": {"value": {"N": str(value)}}}
+
+    def describe_table(self, TableName: str, **kwargs) -> dict:
+        time.sleep(self.latency)
+        return {"Table": {"TableName": TableName, "TableStatus": "ACTIVE"}}
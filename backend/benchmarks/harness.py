@@ -0,0 +1,318 @@
+"""
+Reproducible load test of the backend against local Bedrock and S3 fakes
+Drives multi-turn visitor sessions (EN and FR, /chat and /chat/stream) at
+rising concurrency, in-process or through uvicorn over TCP, and reports
+throughput, latency percentiles, time to first streamed token, memory growth
+and cold-start time. Results are written as JSON so runs can be compared
+across commits. The in-process transport hands over a streamed body only once
+it is complete, so time to first token is meaningful with --uvicorn only.
+
+Usage (from backend/):
+    python -m benchmarks.harness --output before.json
+    python -m benchmarks.harness --output after.json --compare before.json
+Options: --uvicorn, --levels 1,4,16,64, --latency 0.5, --stream-ratio 0.5, --seed 1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import benchmarks.load_chat  # noqa: F401  (sets the benchmark environment before server is imported)
+import httpx
+
+import server
+from benchmarks.fakes import FakeBedrock, FakeS3
+
+# Visitor scripts: each session follows one, possibly stopping early
+SCRIPTS = [
+    ["Where did you study?", "What did you focus on?", "Would you recommend that program?", "Thanks!"],
+    ["What is your current job?", "What does a typical day look like?", "Which tools do you use?",
+     "How big is your team?", "What is the hardest part?"],
+    ["Quelle est ta formation?", "Pourquoi la cybersécurité?", "Quelles certifications as-tu?", "Merci!"],
+    ["What certifications do you have?", "Which one was the hardest?", "How long did you study for it?"],
+    ["Quel est ton emploi actuel?", "Quelles sont tes responsabilités?", "Tu gères une équipe?",
+     "Comment gères-tu un incident?", "Merci beaucoup"],
+    ["How can I contact you?", "Are you open to new opportunities?"],
+]
+
+COLD_START_PROBE = """
+import os, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+from benchmarks.fakes import FakeBedrock, FakeS3
+server.bedrock_client = FakeBedrock(latency=0)
+server.s3_client = FakeS3()
+from fastapi.testclient import TestClient
+response = TestClient(server.app).post("/chat", json={"message": "Where did you study?"})
+response.raise_for_status()
+done = time.perf_counter()
+print((imported - start) * 1000, (done - start) * 1000)
+"""
+
+
+def rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.first_token: list[float] = []
+        self.errors = 0
+        self.status: dict[int, int] = {}
+
+
+async def post_chat(client: httpx.AsyncClient, message: str, session_id, stats: Stats):
+    start = time.perf_counter()
+    response = await client.post("/chat", json={"message": message, "session_id": session_id})
+    stats.latencies.append(time.perf_counter() - start)
+    stats.status[response.status_code] = stats.status.get(response.status_code, 0) + 1
+    if response.status_code != 200:
+        stats.errors += 1
+        return session_id
+    return response.json()["session_id"]
+
+
+async def post_stream(client: httpx.AsyncClient, message: str, session_id, stats: Stats):
+    start = time.perf_counter()
+    first = None
+    event = None
+    async with client.stream("POST", "/chat/stream", json={"message": message, "session_id": session_id}) as response:
+        stats.status[response.status_code] = stats.status.get(response.status_code, 0) + 1
+        if response.status_code != 200:
+            stats.errors += 1
+            stats.latencies.append(time.perf_counter() - start)
+            return session_id
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+                if event == "session":
+                    session_id = data["session_id"]
+                elif event == "delta" and first is None:
+                    first = time.perf_counter() - start
+                elif event == "error":
+                    stats.errors += 1
+    stats.latencies.append(time.perf_counter() - start)
+    if first is not None:
+        stats.first_token.append(first)
+    return session_id
+
+
+async def run_session(client: httpx.AsyncClient, rng: random.Random, stream_ratio: float, think: float, stats: Stats):
+    script = rng.choice(SCRIPTS)
+    turns = script[: rng.randint(1, len(script))]
+    session_id = None
+    for message in turns:
+        post = post_stream if rng.random() < stream_ratio else post_chat
+        session_id = await post(client, message, session_id, stats)
+        if think:
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+
+async def run_concurrency(base_url: str, transport, concurrency: int, sessions: int, args, seed: int) -> dict:
+    rng = random.Random(seed)
+    stats = Stats()
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=120, limits=limits) as client:
+        queue: asyncio.Queue = asyncio.Queue()
+        for _ in range(sessions):
+            queue.put_nowait(random.Random(rng.random()))
+
+        async def worker():
+            while not queue.empty():
+                await run_session(client, queue.get_nowait(), args.stream_ratio, args.think, stats)
+
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    requests = len(stats.latencies)
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "requests": requests,
+        "errors": stats.errors,
+        "status": {str(code): n for code, n in sorted(stats.status.items())},
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(stats.latencies) * 1000, 2) if requests else 0.0,
+            "p50": round(percentile(stats.latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(stats.latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(stats.latencies, 0.99) * 1000, 2),
+        },
+        "first_token_ms": {
+            "p50": round(percentile(stats.first_token, 0.50) * 1000, 2),
+            "p99": round(percentile(stats.first_token, 0.99) * 1000, 2),
+        },
+        "rss_mb": round(rss_mb(), 1),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1),
+    }
+
+
+def start_uvicorn() -> tuple[str, threading.Thread, object]:
+    """Serve server.app on a free local port from a background thread"""
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+    uvicorn_server = uvicorn.Server(config)
+    thread = threading.Thread(target=uvicorn_server.run, daemon=True)
+    thread.start()
+    while not uvicorn_server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}", thread, uvicorn_server
+
+
+def cold_start(runs: int) -> dict:
+    """Fresh interpreters importing the app and serving one /chat against the fakes"""
+    imports, first = [], []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", COLD_START_PROBE],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True, env=os.environ.copy(),
+        )
+        import_ms, first_ms = map(float, result.stdout.split()[-2:])
+        imports.append(import_ms)
+        first.append(first_ms)
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(imports), 1),
+        "first_request_ms": round(statistics.median(first), 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict):
+    """Print throughput and latency changes per concurrency level against a baseline run"""
+    print(f"\nvs {baseline['meta']['commit']}:")
+    print(f"{'conc':>5} {'req/s':>16} {'p50 ms':>16} {'p99 ms':>16}")
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in current["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        cells = []
+        for now, then in (
+            (level["throughput_rps"], before["throughput_rps"]),
+            (level["latency_ms"]["p50"], before["latency_ms"]["p50"]),
+            (level["latency_ms"]["p99"], before["latency_ms"]["p99"]),
+        ):
+            change = (now - then) / then * 100 if then else 0.0
+            cells.append(f"{now:>8.1f} {change:>+6.1f}%")
+        print(f"{level['concurrency']:>5} " + " ".join(cells))
+    if "cold_start" in current and "cold_start" in baseline:
+        print(f"cold start first request: {current['cold_start']['first_request_ms']} ms "
+              f"(was {baseline['cold_start']['first_request_ms']} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="comma-separated concurrency levels")
+    parser.add_argument("--sessions", type=int, default=4, help="sessions per concurrent client at each level")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Bedrock time to first token in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="fake Bedrock latency jitter as a fraction")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="seconds between streamed chunks")
+    parser.add_argument("--s3-latency", type=float, default=0.01, help="fake S3 latency per call in seconds")
+    parser.add_argument("--stream-ratio", type=float, default=0.5, help="fraction of turns sent to /chat/stream")
+    parser.add_argument("--think", type=float, default=0.0, help="mean think time between turns in seconds")
+    parser.add_argument("--uvicorn", action="store_true", help="serve over TCP with uvicorn instead of in-process")
+    parser.add_argument("--cold-start-runs", type=int, default=3, help="fresh interpreters for cold start (0 to skip)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    args = parser.parse_args()
+
+    server.bedrock_client = FakeBedrock(
+        latency=args.latency,
+        reply="Je suis conseiller principal en cybersécurité. " * 8,
+        total_tokens=None,
+        jitter=args.jitter,
+        chunk_delay=args.chunk_delay,
+        seed=args.seed,
+    )
+    server.s3_client = FakeS3(latency=args.s3_latency)
+    server.token_budget.limit = 10**12
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "mode": "uvicorn" if args.uvicorn else "in-process",
+            "args": vars(args),
+        },
+        "levels": [],
+    }
+    if args.cold_start_runs:
+        results["cold_start"] = cold_start(args.cold_start_runs)
+
+    if args.uvicorn:
+        base_url, thread, uvicorn_server = start_uvicorn()
+        transport = None
+    else:
+        base_url, transport = "http://bench", httpx.ASGITransport(app=server.app)
+
+    async def run_all():
+        for i, level in enumerate(int(x) for x in args.levels.split(",")):
+            result = await run_concurrency(base_url, transport, level, level * args.sessions, args, args.seed + i)
+            results["levels"].append(result)
+            latency = result["latency_ms"]
+            print(f"{level:>5} {result['requests']:>6} {result['throughput_rps']:>8.1f} "
+                  f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} "
+                  f"{result['first_token_ms']['p50']:>8.1f} {result['rss_mb']:>7.1f} {result['errors']:>4}")
+
+    print(f"{'conc':>5} {'reqs':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttft ms':>8} {'rss MB':>7} {'errs':>4}")
+    asyncio.run(run_all())
+    if "cold_start" in results:
+        cold = results["cold_start"]
+        print(f"cold start: import {cold['import_ms']} ms, first /chat {cold['first_request_ms']} ms")
+
+    if args.uvicorn:
+        uvicorn_server.should_exit = True
+        thread.join(timeout=5)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
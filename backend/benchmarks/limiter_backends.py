@@ -0,0 +1,80 @@
+"""
+Cost of the shared counter backends
+Times concurrent increments and racing token budgets against the memory, SQLite
+and DynamoDB backends (the latter on FakeDynamoDB with a simulated round trip).
+The correctness checks live in tests/test_limiter_backends.py.
+
+Usage (from backend/): python -m benchmarks.limiter_backends [--latency 0.005]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.fakes import FakeDynamoDB
+from ratelimit import DynamoDBBackend, MemoryBackend, SQLiteBackend, TokenBudget
+
+THREADS = 8
+INCREMENTS = 200
+
+
+def time_counter(backend) -> float:
+    """Concurrent increments of one counter; returns the mean seconds per call"""
+
+    def worker():
+        for _ in range(INCREMENTS):
+            backend.incr("check", 1, 1, 120)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return elapsed / (THREADS * INCREMENTS) * THREADS
+
+
+def time_budgets(backend, limit: int = 20_000, instances: int = 4):
+    """Budgets racing for one shared counter; returns (seconds, tokens leased)"""
+    budgets = [TokenBudget(backend, limit, lease_size=3000, key=f"budget-{id(backend)}") for _ in range(instances)]
+    barrier = threading.Barrier(instances)
+
+    def worker(budget: TokenBudget):
+        barrier.wait()
+        while budget.reserve(700):
+            pass
+
+    threads = [threading.Thread(target=worker, args=(budget,)) for budget in budgets]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(budget._leased for budget in budgets)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated DynamoDB round trip in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="twin-limits-") as directory:
+        backends = [
+            ("memory", MemoryBackend()),
+            ("sqlite", SQLiteBackend(os.path.join(directory, "limits.db"))),
+            ("dynamodb", DynamoDBBackend("limits", client=FakeDynamoDB(latency=args.latency))),
+        ]
+        print(f"{'backend':>9} {'us/incr':>9} {'budget ms':>10} {'leased':>8}")
+        for name, backend in backends:
+            backend.warm_up()
+            per_call = time_counter(backend)
+            elapsed, leased = time_budgets(backend)
+            print(f"{name:>9} {per_call * 1e6:>9.0f} {elapsed * 1e3:>10.1f} {leased:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Load benchmark for /chat against fake Bedrock and S3 clients
+Drives multi-turn sessions at rising concurrency in-process and reports
+throughput, which should scale with concurrency while the event loop is free.
+
+Usage (from backend/): python -m benchmarks.load_chat [--latency 0.2] [--turns 3]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("CORS_ORIGINS", "http://localhost:3000")
+os.environ.setdefault("RATE_LIMIT_MAX", "1000000")
+os.environ.setdefault("RATE_LIMIT_WINDOW", "60")
+os.environ.setdefault("DEFAULT_AWS_REGION", "us-east-1")
+os.environ.setdefault("BEDROCK_MODEL_ID", "fake-model")
+os.environ.setdefault("USE_S3", "true")
+os.environ.setdefault("S3_BUCKET", "benchmark-memory")
+os.environ.setdefault("MEMORY_DIR", tempfile.mkdtemp(prefix="twin-bench-"))
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+import httpx
+
+import server
+from benchmarks.fakes import FakeBedrock, FakeS3
+
+
+async def run_session(client: httpx.AsyncClient, turns: int, latencies: list[float]):
+    session_id = None
+    for turn in range(turns):
+        start = time.perf_counter()
+        response = await client.post("/chat", json={"message": f"Question {turn}", "session_id": session_id})
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        session_id = response.json()["session_id"]
+
+
+async def run_level(concurrency: int, turns: int) -> dict:
+    transport = httpx.ASGITransport(app=server.app)
+    latencies: list[float] = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_session(client, turns, latencies) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) > 1 else latencies[0] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Bedrock latency in seconds")
+    parser.add_argument("--turns", type=int, default=3, help="turns per session")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="comma-separated concurrency levels")
+    args = parser.parse_args()
+
+    server.bedrock_client = FakeBedrock(latency=args.latency, total_tokens=1)
+    server.s3_client = FakeS3(latency=0.01)
+    server.token_budget.limit = 10**12
+
+    print(f"{'sessions':>8} {'requests':>9} {'req/s':>8} {'p50 ms':>8}")
+    for level in (int(x) for x in args.levels.split(",")):
+        result = asyncio.run(run_level(level, args.turns))
+        print(f"{result['concurrency']:>8} {result['requests']:>9} {result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Overhead of the built-in metrics on /chat
+Measures the cost of one stage timer, counts the observations a /chat request
+makes, and compares the resulting per-request cost with the in-process request
+time against zero-latency fakes (the worst case) and with a realistic model latency.
+
+Usage (from backend/): python -m benchmarks.metrics_overhead [--requests 2000]
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.load_chat import run_level
+import server
+import metrics
+from benchmarks.fakes import FakeBedrock, FakeS3
+
+
+def timer_cost_ns(n: int) -> float:
+    """Nanoseconds per `with stage(...)` block, net of an empty loop"""
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        pass
+    empty = time.perf_counter_ns() - start
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        with metrics.stage("benchmark"):
+            pass
+    return (time.perf_counter_ns() - start - empty) / n
+
+
+def observations() -> int:
+    total = 0
+    for _, (kind, _, series) in metrics.registry._families.items():
+        if kind == "histogram":
+            total += sum(h.count for h in series.values())
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per measurement")
+    parser.add_argument("--model-latency", type=float, default=1.0, help="typical Bedrock latency in seconds")
+    args = parser.parse_args()
+
+    server.bedrock_client = FakeBedrock(latency=0, total_tokens=1)
+    server.s3_client = FakeS3(latency=0)
+    server.token_budget.limit = 10**12
+
+    per_timer = timer_cost_ns(200_000)
+
+    # Warm up, then count observations per request
+    asyncio.run(run_level(8, 5))
+    before = observations()
+    result = asyncio.run(run_level(10, args.requests // 10))
+    per_request = (observations() - before) / result["requests"]
+    request_us = 1e6 / result["throughput_rps"]
+    overhead_us = per_request * per_timer / 1000
+
+    started = time.perf_counter()
+    text = metrics.registry.render_prometheus()
+    render_ms = (time.perf_counter() - started) * 1000
+
+    print(f"stage timer:              {per_timer:8.0f} ns")
+    print(f"observations per request: {per_request:8.1f}")
+    print(f"metrics cost per request: {overhead_us:8.1f} us")
+    print(f"in-process request time:  {request_us:8.0f} us  -> {overhead_us / request_us:.2%} overhead")
+    print(f"with {args.model_latency:.1f} s model latency:  {overhead_us / (args.model_latency * 1e6):.4%} overhead")
+    print(f"/metrics render:          {render_ms:8.2f} ms ({len(text.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
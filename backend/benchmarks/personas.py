@@ -0,0 +1,76 @@
+"""
+Persona resolution cost: first request for a persona versus a warm lookup
+Generates synthetic personas with build-time snapshots, then resolves a skewed
+stream of persona ids through PersonaCache at a few byte budgets.
+
+Usage (from backend/): python -m benchmarks.personas [--personas 50] [--requests 5000]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import personas
+import resources
+
+SUMMARY = (
+    "Conseillère en sécurité de l'information, j'accompagne les équipes dans la gestion des risques, "
+    "la conformité et la sensibilisation. "
+)
+
+
+def make_personas(root: str, count: int):
+    for index in range(count):
+        directory = os.path.join(root, f"twin-{index:03d}")
+        os.makedirs(directory)
+        with open(os.path.join(directory, "facts.json"), "w", encoding="utf-8") as f:
+            json.dump({"full_name": f"Twin {index}", "name": f"Twin{index}", "email": f"twin{index}@example.com"}, f)
+        with open(os.path.join(directory, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(SUMMARY * 30)
+        with open(os.path.join(directory, "style.txt"), "w", encoding="utf-8") as f:
+            f.write("Direct, warm, concise.")
+        resources.build_snapshot(directory, os.path.join(directory, resources.SNAPSHOT_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--personas", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="twin-personas-") as root:
+        make_personas(root, args.personas)
+        resources.PERSONAS_DIR = root
+        ids = [f"twin-{index:03d}" for index in range(args.personas)]
+        # Zipf-like popularity: a few twins get most of the traffic
+        weights = [1 / (rank + 1) for rank in range(args.personas)]
+        stream = random.Random(7).choices(ids, weights, k=args.requests)
+
+        size = personas.PersonaCache().get(ids[0]).size
+        print(f"{args.personas} personas of ~{size // 1024} KiB, {args.requests} requests")
+        print(f"{'budget':>10} {'hit rate':>9} {'mean us':>8} {'miss us':>8} {'hit us':>7}")
+        for fraction in (0.1, 0.25, 0.5, 1.0):
+            cache = personas.PersonaCache(max_bytes=int(size * args.personas * fraction))
+            hit_time = miss_time = 0.0
+            for persona_id in stream:
+                misses = cache.misses
+                start = time.perf_counter()
+                cache.get(persona_id)
+                elapsed = time.perf_counter() - start
+                if cache.misses > misses:
+                    miss_time += elapsed
+                else:
+                    hit_time += elapsed
+            stats = cache.stats()
+            print(
+                f"{fraction:>9.0%} {stats['hits'] / args.requests:>9.1%} "
+                f"{(hit_time + miss_time) / args.requests * 1e6:>8.1f} "
+                f"{miss_time / max(stats['misses'], 1) * 1e6:>8.1f} {hit_time / max(stats['hits'], 1) * 1e6:>7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
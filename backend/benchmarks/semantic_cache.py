@@ -0,0 +1,140 @@
+"""
+Offline evaluation of the semantic response cache
+Stores one English and one French question per topic plus unrelated filler
+questions, then queries paraphrases of stored topics in both languages and
+questions on topics that were never stored. Reports the hit rate on paraphrases,
+the false-hit rate (wrong reply served, including a reply in the other
+language) and lookup latency as the cache grows.
+
+Usage (from backend/): python -m benchmarks.semantic_cache [--threshold 0.75]
+"""
+
+import argparse
+import random
+import time
+
+import semantic_cache
+from semantic_cache import SemanticCache
+
+# Paraphrase groups per language: the first question of each is stored, the others are queries
+STORED = {
+    "education": {
+        "en": ["Where did you study?", "What is your education?", "What degree do you have?", "Tell me about your studies"],
+        "fr": ["Quelle est ta formation?", "Où as-tu étudié?", "Quels diplômes as-tu?"],
+    },
+    "certifications": {
+        "en": ["What certifications do you have?", "Are you certified?", "Which certifications do you hold?"],
+        "fr": ["Quelles certifications as-tu?", "As-tu des certifications en sécurité?", "Es-tu certifié?"],
+    },
+    "languages": {
+        "en": ["What languages do you speak?", "Which languages do you speak?", "Are you bilingual?"],
+        "fr": ["Quelles langues parles-tu?", "Tu parles quelles langues?", "Es-tu bilingue?"],
+    },
+    "current_job": {
+        "en": ["What is your current job?", "Where do you work now?", "What is your current role?"],
+        "fr": ["Quel est ton emploi actuel?", "Où travailles-tu présentement?", "Quel est ton poste actuel?"],
+    },
+    "contact": {
+        "en": ["How can I contact you?", "How do I reach you?", "What is your email?"],
+        "fr": ["Comment puis-je te joindre?", "Quel est ton courriel?", "Comment te contacter?"],
+    },
+    "hobbies": {
+        "en": ["What are your hobbies?", "What do you do in your free time?", "What are your interests outside work?"],
+        "fr": ["Quels sont tes loisirs?", "Que fais-tu dans tes temps libres?", "Quelles sont tes passions?"],
+    },
+}
+
+# Topics never stored: any hit here serves a reply to a different question
+UNSEEN = [
+    "What is your biggest weakness?",
+    "Why should we hire you?",
+    "What salary are you expecting?",
+    "Quel est ton plus grand défaut?",
+    "Pourquoi devrions-nous t'embaucher?",
+    "Do you like cats or dogs?",
+    "What was your most difficult project?",
+    "Quel a été ton projet le plus difficile?",
+    "Where do you see yourself in five years?",
+    "Où te vois-tu dans cinq ans?",
+    "Are you open to relocating?",
+    "What is your favourite book?",
+]
+
+FILLER_SUBJECTS = [
+    "zero trust", "ransomware", "phishing", "cloud migration", "incident response", "risk appetite",
+    "identity management", "the board", "audits", "third-party risk", "encryption", "backups",
+    "remote work", "mentoring", "budgets", "vendor selection", "threat intelligence", "compliance",
+]
+FILLER_TEMPLATES = [
+    "What do you think about {}?",
+    "How would you handle {}?",
+    "Que penses-tu de {}?",
+    "Have you worked on {} at {}?",
+    "What is your approach to {} for {}?",
+]
+
+
+def filler(rng: random.Random) -> str:
+    template = rng.choice(FILLER_TEMPLATES)
+    return template.format(*(rng.choice(FILLER_SUBJECTS) for _ in range(template.count("{}"))))
+
+
+def evaluate(size: int, threshold: float, rng: random.Random) -> dict:
+    cache = SemanticCache(max_entries=size + 2 * len(STORED), threshold=threshold)
+    for topic, languages in STORED.items():
+        for language, questions in languages.items():
+            cache.put(questions[0], f"{topic}/{language}", "v1")
+    for i in range(size):
+        cache.put(f"{filler(rng)} ({i})", "filler", "v1")
+
+    latencies = []
+    correct = wrong = paraphrases = 0
+    for topic, languages in STORED.items():
+        for language, questions in languages.items():
+            for question in questions[1:]:
+                started = time.perf_counter()
+                reply = cache.lookup(question, "v1")
+                latencies.append(time.perf_counter() - started)
+                paraphrases += 1
+                # The right topic answered in the other language is still a wrong reply
+                if reply == f"{topic}/{language}":
+                    correct += 1
+                elif reply is not None:
+                    wrong += 1
+
+    unseen_hits = 0
+    for question in UNSEEN:
+        started = time.perf_counter()
+        reply = cache.lookup(question, "v1")
+        latencies.append(time.perf_counter() - started)
+        if reply is not None:
+            unseen_hits += 1
+
+    latencies.sort()
+    return {
+        "entries": len(cache),
+        "hit_rate": correct / paraphrases,
+        "false_hit_rate": (wrong + unseen_hits) / (paraphrases + len(UNSEEN)),
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threshold", type=float, default=semantic_cache.SEMANTIC_CACHE_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if semantic_cache.np is None:
+        raise SystemExit("numpy is not installed; the semantic cache is unavailable")
+
+    print(f"threshold {args.threshold}")
+    print(f"{'entries':>8} {'hit rate':>9} {'false hit':>10} {'p50 us':>8} {'p99 us':>8}")
+    for size in (0, 100, 1000, 5000):
+        r = evaluate(size, args.threshold, random.Random(args.seed))
+        print(f"{r['entries']:>8} {r['hit_rate']:>9.0%} {r['false_hit_rate']:>10.0%} {r['p50_us']:>8.0f} {r['p99_us']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
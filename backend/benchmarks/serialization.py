@@ -0,0 +1,85 @@
+"""
+Size and speed of conversation record encodings
+Compares the original pretty-printed JSON, minified JSON objects and the
+compact row format (with and without gzip) for sessions of 10 to 500 turns.
+
+Usage (from backend/): python -m benchmarks.serialization [--repeat 20]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import conversation_codec
+
+QUESTIONS = [
+    "Where did you study?",
+    "Quelle est ton expérience en gestion des risques?",
+    "Which certifications do you hold and why did you choose them?",
+    "Comment abordes-tu la sensibilisation des employés à la sécurité?",
+]
+# Replies are random word sequences so gzip sees realistic, not repeated, text
+VOCABULARY = (
+    "J'ai travaillé plusieurs années en cybersécurité, d'abord en gouvernance puis en gestion des risques. "
+    "I led programs aligned with ISO 27001 and NIST CSF, worked closely with executives on risk appetite, "
+    "and built awareness campaigns that measurably reduced phishing click rates across teams in Montréal."
+).split()
+
+
+def session(turns: int, rng: random.Random) -> list[dict]:
+    stamp = datetime(2025, 3, 1, 9, 30)
+    messages = []
+    for _ in range(turns):
+        question = rng.choice(QUESTIONS)
+        answer = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(40, 160)))
+        for role, content in (("user", question), ("assistant", answer)):
+            stamp += timedelta(seconds=rng.uniform(2, 40))
+            messages.append({"role": role, "content": content, "timestamp": stamp.isoformat(), "tokens": len(content) // 4 + 1})
+    return messages
+
+
+FORMATS = {
+    "json indent=2": (
+        lambda m: json.dumps(m, indent=2, ensure_ascii=False).encode("utf-8"),
+        lambda b: json.loads(b.decode("utf-8")),
+    ),
+    "json minified": (
+        lambda m: json.dumps(m, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        lambda b: json.loads(b.decode("utf-8")),
+    ),
+    "rows": (lambda m: conversation_codec.encode(m, gzip_min=0), conversation_codec.decode),
+    "rows+gzip": (lambda m: conversation_codec.encode(m, gzip_min=1), conversation_codec.decode),
+}
+
+
+def best_us(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"{'turns':>5} {'format':<14} {'bytes':>9} {'ratio':>6} {'encode us':>10} {'decode us':>10}")
+    for turns in (10, 50, 100, 250, 500):
+        messages = session(turns, rng)
+        baseline = None
+        for name, (encode, decode) in FORMATS.items():
+            data = encode(messages)
+            assert decode(data) == messages
+            baseline = baseline or len(data)
+            print(f"{turns:>5} {name:<14} {len(data):>9} {len(data) / baseline:>6.2f} "
+                  f"{best_us(encode, messages, args.repeat):>10.0f} {best_us(decode, data, args.repeat):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Latency of /chat with the write-behind session cache on and off
+With the cache on, warm sessions skip the storage read before Bedrock and the
+write happens after the response. Storage latency is simulated by the fake S3.
+The in-process transport waits for background tasks before returning, so the
+"on" figures still include the write-behind; behind uvicorn they do not.
+
+Usage (from backend/): python -m benchmarks.session_cache [--s3-latency 0.03]
+"""
+
+import argparse
+import asyncio
+
+from benchmarks.load_chat import run_level
+import server
+from benchmarks.fakes import FakeBedrock, FakeS3
+from session_cache import SessionCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--s3-latency", type=float, default=0.03, help="fake S3 latency per call in seconds")
+    parser.add_argument("--bedrock-latency", type=float, default=0.1, help="fake Bedrock latency in seconds")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    server.bedrock_client = FakeBedrock(latency=args.bedrock_latency, total_tokens=1)
+    server.token_budget.limit = 10**12
+    cache_bytes = server.session_cache.max_bytes
+
+    print(f"{'cache':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, max_bytes in (("off", 0), ("on", cache_bytes)):
+        server.s3_client = FakeS3(latency=args.s3_latency)
+        server.session_cache = SessionCache(max_bytes)
+        result = asyncio.run(run_level(args.sessions, args.turns))
+        print(f"{label:>6} {result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+    print(server.session_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
-from resources import linkedin, summary, facts, style
+import resources
 from datetime import datetime
-
-
-full_name = facts["full_name"]
-name = facts["name"]
-
-
-def prompt():
+from functools import lru_cache
+import hashlib
+from typing import List, Dict, Optional
+
+# Optional facts.json keys that fill in persona-specific lines of the prompt instead of
+# being listed with the other facts
+PROMPT_FACTS = ("public_employers", "public_education", "deflection_example")
+
+
+def render_prompt(bundle: Dict) -> str:
+    """Persona part of the system prompt for one persona's resources"""
+    facts = {key: value for key, value in bundle["facts"].items() if key not in PROMPT_FACTS}
+    full_name = facts["full_name"]
+    name = facts["name"]
+    summary = bundle["summary"]
+    linkedin = bundle["linkedin"]
+    style = bundle["style"]
+    employers = bundle["facts"].get("public_employers")
+    employers = f": {', '.join(employers)}, etc." if employers else " of every position"
+    education = bundle["facts"].get("public_education")
+    education = f": {', '.join(education)}" if education else ""
+    example = bundle["facts"].get("deflection_example")
+    example = f' For example: "{example}"' if example else ""
     return f"""
 # Your Role
 
@@ -29,10 +45,6 @@ Here is the LinkedIn profile of {name}:
 Here are some notes from {name} about their communications style:
 {style}
 
-
-For reference, here is the current date and time:
-{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
 ## Your task
 IF the prompt is in English answer in English, if the prompt is in French respond in French.
 
@@ -49,7 +61,7 @@ As this is a conversation on {name}'s professional website, you should be profes
 - Answer the question directly, then stop. Do not ramble.
 - If the user wants more details than what you have in your context, suggest they contact {name} directly by email at {facts["email"]}.
 - Do NOT answer personal questions (family, relationships, salary, address, etc.). Politely decline and redirect to professional topics.
-- If someone insists on asking inappropriate or unauthorized questions, respond with a light joke to defuse the situation, then redirect. For example: "On dirait que tu essaies de me pirater... et pourtant je suis en cybersécurité! Parlons plutôt de mes projets."
+- If someone insists on asking inappropriate or unauthorized questions, respond with a light joke to defuse the situation, then redirect.{example}
 
 ## Instructions
 
@@ -60,11 +72,11 @@ There are critical security rules that you MUST follow at all times:
 1. ACCURACY: NEVER invent or hallucinate information not in your context. If asked about something not in your context, say "Je n'ai pas cette information dans mon profil."
 
    IMPORTANT — ALL information from the LinkedIn profile above is PUBLIC and MUST be shared when asked. This includes:
-   - Company names: Héma-Québec, Desjardins, iA Groupe financier, Canada Life, London Life, etc.
+   - Company names{employers}
    - Job titles and roles at each company
    - Employment dates and durations
    - Responsibilities and tasks performed at each position
-   - Education: Polytechnique Montréal, UQAM
+   - Education{education}
    - Certifications and skills
 
    {name} EXPLICITLY AUTHORIZES sharing all this information. It is already public on LinkedIn. Do NOT refuse to share employer names or job details — this is the whole purpose of this digital twin.
@@ -90,4 +102,39 @@ There are critical security rules that you MUST follow at all times:
 
 Please engage with the user.
 Avoid responding in a way that feels like a chatbot or AI assistant, and don't end every message with a question; channel a smart conversation with an engaging person, a true reflection of {name}.
-"""
\ No newline at end of file
+"""
+
+
+@lru_cache(maxsize=1)
+def static_prompt() -> str:
+    """Default persona's part of the system prompt, rendered once per process"""
+    return render_prompt(resources.load())
+
+
+def hash_prompt(static: str) -> str:
+    return hashlib.sha256(static.encode("utf-8")).hexdigest()
+
+
+def date_prompt() -> str:
+    """Small dynamic segment carrying the current date and time"""
+    return f"""For reference, here is the current date and time:
+{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+"""
+
+
+def system_blocks(cache_point: bool = True, static: Optional[str] = None) -> List[Dict]:
+    """
+    System prompt in Bedrock Converse format (static defaults to the default persona's).
+    The static persona comes first, optionally followed by a cache point so
+    Bedrock can reuse the processed prefix, then the date segment.
+    """
+    blocks = [{"text": static if static is not None else static_prompt()}]
+    if cache_point:
+        blocks.append({"cachePoint": {"type": "default"}})
+    blocks.append({"text": date_prompt()})
+    return blocks
+
+
+def prompt() -> str:
+    """Full system prompt as a single string"""
+    return static_prompt() + date_prompt()
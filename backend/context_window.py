@@ -0,0 +1,60 @@
+"""
+Token-aware conversation window for Bedrock requests
+Packs the newest turns that fit a token budget, keeping the strict
+user/assistant alternation that the Converse API requires.
+"""
+
+import os
+from typing import Dict, List
+
+# Tokens of conversation history sent with each request (the system prompt is separate)
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: about four characters per token for English and French"""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: Dict) -> int:
+    """Token estimate for a stored message, cached on the message under "tokens" """
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = message["tokens"] = estimate_tokens(message["content"])
+    return tokens
+
+
+def select_history(conversation: List[Dict], budget: int = CONTEXT_TOKEN_BUDGET) -> List[Dict]:
+    """
+    Newest messages that fit the budget, as whole user/assistant pairs.
+    The result starts with a user message and ends with an assistant message,
+    so the new user message can be appended after it.
+    """
+    selected: List[Dict] = []
+    used = 0
+    i = len(conversation) - 1
+    while i >= 1:
+        assistant, user = conversation[i], conversation[i - 1]
+        if assistant["role"] != "assistant" or user["role"] != "user":
+            # Skip an unpaired message (e.g. a turn whose reply was never stored)
+            i -= 1
+            continue
+        cost = message_tokens(user) + message_tokens(assistant)
+        if used + cost > budget:
+            break
+        selected.append(assistant)
+        selected.append(user)
+        used += cost
+        i -= 2
+    selected.reverse()
+    return selected
+
+
+def build_messages(conversation: List[Dict], user_message: str, budget: int = CONTEXT_TOKEN_BUDGET) -> List[Dict]:
+    """Build messages in Bedrock format (alternating user/assistant)"""
+    messages = [
+        {"role": msg["role"], "content": [{"text": msg["content"]}]}
+        for msg in select_history(conversation, budget)
+    ]
+    messages.append({"role": "user", "content": [{"text": user_message}]})
+    return messages
@@ -0,0 +1,105 @@
+"""
+Compact encoding of conversation records
+Messages are stored as rows [role, timestamp, tokens, content] instead of
+objects: the role is a small integer and the ISO timestamp an integer count of
+microseconds since the epoch (the wall-clock value is kept as is, so it decodes
+back to the identical string). Messages that don't fit the row shape are kept
+as objects.
+
+Stored objects start with a version header (b"TWR", version, flags) and are
+gzip-compressed past CONVERSATION_GZIP_MIN bytes. Plain JSON written by earlier
+versions has no header and is still decoded. Local JSON Lines files hold one
+row per line, next to any object lines written before.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+
+MAGIC = b"TWR"
+VERSION = 1
+FLAG_GZIP = 0x01
+
+# Payloads at least this large are gzip-compressed (0 disables compression)
+CONVERSATION_GZIP_MIN = int(os.environ.get("CONVERSATION_GZIP_MIN", "4096"))
+
+ROLES = ("user", "assistant")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+_FIELDS = frozenset(("role", "content", "timestamp", "tokens"))
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _to_row(message: Dict) -> Union[list, Dict]:
+    role = _ROLE_CODES.get(message.get("role"))
+    if role is None or not _FIELDS.issuperset(message) or not isinstance(message.get("content"), str):
+        return message
+    try:
+        stamp = datetime.fromisoformat(message["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return message
+    if stamp.tzinfo is not None:
+        return message
+    micros = (stamp - _EPOCH) // _MICROSECOND
+    # Only timestamps that decode back to the same string become integers
+    if _timestamp(micros) != message["timestamp"]:
+        return message
+    return [role, micros, message.get("tokens"), message["content"]]
+
+
+def _timestamp(micros: int) -> str:
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def _from_row(row: Union[list, Dict]) -> Dict:
+    if isinstance(row, dict):
+        return row
+    role, stamp, tokens, content = row
+    message = {
+        "role": ROLES[role],
+        "content": content,
+        "timestamp": _timestamp(stamp),
+    }
+    if tokens is not None:
+        message["tokens"] = tokens
+    return message
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode(messages: List[Dict], gzip_min: Optional[int] = None) -> bytes:
+    """Encode messages as a versioned record"""
+    payload = _dumps([_to_row(m) for m in messages]).encode("utf-8")
+    threshold = CONVERSATION_GZIP_MIN if gzip_min is None else gzip_min
+    flags = 0
+    if threshold and len(payload) >= threshold:
+        payload = gzip.compress(payload, compresslevel=6, mtime=0)
+        flags |= FLAG_GZIP
+    return MAGIC + bytes((VERSION, flags)) + payload
+
+
+def decode(data: bytes) -> List[Dict]:
+    """Decode a record, or a plain JSON array written by earlier versions"""
+    if not data.startswith(MAGIC):
+        return json.loads(data.decode("utf-8"))
+    version, flags = data[3], data[4]
+    if version > VERSION:
+        raise ValueError(f"Unsupported conversation record version {version}")
+    payload = data[5:]
+    if flags & FLAG_GZIP:
+        payload = gzip.decompress(payload)
+    return [_from_row(row) for row in json.loads(payload)]
+
+
+def encode_line(message: Dict) -> str:
+    """One JSON Lines entry (without the newline)"""
+    return _dumps(_to_row(message))
+
+
+def decode_line(line: Union[str, bytes]) -> Dict:
+    return _from_row(json.loads(line))
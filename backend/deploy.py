@@ -1,26 +1,117 @@
+"""
+Build the Lambda artifacts
+lambda-layer.zip holds the dependencies and is rebuilt (in the Lambda Docker image)
+only when requirements.txt or the layer recipe changes; otherwise it comes from
+.build/. lambda-deployment.zip holds the application code and data, so a code-only
+change repackages in seconds.
+
+Usage (from backend/): uv run deploy.py [--rebuild-layer]
+"""
+
+import argparse
+import compileall
+import hashlib
 import os
+import py_compile
+import re
 import shutil
-import zipfile
 import subprocess
+import sys
+import zipfile
+from collections import defaultdict
 
+from resources import SNAPSHOT_FILE, build_snapshot, persona_dirs
 
-def main():
-    print("Creating Lambda deployment package...")
+BUILD_DIR = ".build"
+LAYER_ZIP = "lambda-layer.zip"
+FUNCTION_ZIP = "lambda-deployment.zip"
 
-    # Clean up
-    if os.path.exists("lambda-package"):
-        shutil.rmtree("lambda-package")
-    if os.path.exists("lambda-deployment.zip"):
-        os.remove("lambda-deployment.zip")
+# The official AWS Lambda Python 3.12 image, so wheels match the runtime
+LAMBDA_IMAGE = "public.ecr.aws/lambda/python:3.12"
+LAMBDA_PYTHON = (3, 12)
 
-    # Create package directory
-    os.makedirs("lambda-package")
+APP_FILES = ["server.py", "lambda_handler.py", "context.py", "resources.py", "security.py", "io_pool.py", "import_profile.py", "ratelimit.py", "storage.py", "session_cache.py", "context_window.py", "response_cache.py", "semantic_cache.py", "singleflight.py", "scheduler.py", "metrics.py", "conversation_codec.py", "personas.py"]
+
+# Needed only for local development or at build time, never imported on Lambda
+BUILD_ONLY_REQUIREMENTS = {"uvicorn", "pypdf", "python-dotenv"}
+
+# botocore ships models for every AWS service; only these are called at runtime
+BOTOCORE_SERVICES = {"s3", "bedrock-runtime", "dynamodb"}
+
+# Bump when the stripping rules change so cached layers are rebuilt
+LAYER_RECIPE = 1
+
+# Lambda's limit on the unzipped function plus its layers
+UNZIPPED_LIMIT = 250 * 1024 * 1024
+
+# Fixed timestamp so unchanged inputs give a byte-identical zip (and no Terraform update)
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+def runtime_requirements() -> str:
+    """requirements.txt without the build-only packages"""
+    lines = []
+    with open("requirements.txt", "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            name = re.split(r"[\s<>=!~\[;]", line, maxsplit=1)[0].lower()
+            if line and not line.startswith("#") and name not in BUILD_ONLY_REQUIREMENTS:
+                lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def layer_key(requirements: str) -> str:
+    material = "\n".join((requirements, LAMBDA_IMAGE, f"recipe={LAYER_RECIPE}", ",".join(sorted(BOTOCORE_SERVICES))))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def prepare_layer(directory: str):
+    """Strip what the runtime never reads, then precompile (run inside the Lambda image)"""
+    shutil.rmtree(os.path.join(directory, "bin"), ignore_errors=True)
+    for root, dirs, files in os.walk(directory):
+        for name in list(dirs):
+            if name in ("__pycache__", "tests", "test"):
+                shutil.rmtree(os.path.join(root, name))
+                dirs.remove(name)
+        if root.endswith(".dist-info"):
+            # importlib.metadata only needs METADATA (and entry points)
+            for name in files:
+                if name not in ("METADATA", "entry_points.txt"):
+                    os.remove(os.path.join(root, name))
+            for name in list(dirs):
+                shutil.rmtree(os.path.join(root, name))
+                dirs.remove(name)
+            continue
+        for name in files:
+            if name.endswith(".pyi"):
+                os.remove(os.path.join(root, name))
+
+    for package in ("botocore", "boto3"):
+        data = os.path.join(directory, package, "data")
+        if os.path.isdir(data):
+            for name in os.listdir(data):
+                path = os.path.join(data, name)
+                if os.path.isdir(path) and name not in BOTOCORE_SERVICES:
+                    shutil.rmtree(path)
+
+    # The Lambda filesystem is read-only, so modules are compiled on every cold start
+    # unless the .pyc files ship; unchecked hashes skip the source mtime check
+    compileall.compile_dir(
+        directory, quiet=1, workers=0, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+    )
 
-    # Install dependencies using Docker with Lambda runtime image
-    print("Installing dependencies for Lambda runtime...")
 
-    # Use the official AWS Lambda Python 3.12 image
-    # This ensures compatibility with Lambda's runtime environment
+def build_layer(key: str, requirements: str) -> str:
+    """Install the dependencies in the Lambda image and zip them as a layer"""
+    staging = os.path.join(BUILD_DIR, "layer")
+    if os.path.exists(staging):
+        shutil.rmtree(staging)
+    os.makedirs(os.path.join(staging, "python"))
+    with open(os.path.join(BUILD_DIR, "requirements.runtime.txt"), "w", encoding="utf-8") as f:
+        f.write(requirements)
+
+    print("Installing dependencies for Lambda runtime...")
+    target = f"/var/task/{BUILD_DIR}/layer/python"
     subprocess.run(
         [
             "docker",
@@ -32,37 +123,133 @@ def main():
             "linux/amd64",  # Force x86_64 architecture
             "--entrypoint",
             "",  # Override the default entrypoint
-            "public.ecr.aws/lambda/python:3.12",
+            LAMBDA_IMAGE,
             "/bin/sh",
             "-c",
-            "pip install --target /var/task/lambda-package -r /var/task/requirements.txt --platform manylinux2014_x86_64 --only-binary=:all: --upgrade",
+            f"pip install --target {target} -r /var/task/{BUILD_DIR}/requirements.runtime.txt "
+            "--platform manylinux2014_x86_64 --only-binary=:all: --upgrade --no-compile "
+            f"&& python /var/task/deploy.py --prepare-layer {target}",
         ],
         check=True,
     )
 
-    # Copy application files
+    path = os.path.join(BUILD_DIR, f"layer-{key}.zip")
+    write_zip(path + ".tmp", staging)
+    os.replace(path + ".tmp", path)
+    shutil.rmtree(staging)
+    return path
+
+
+def write_zip(path: str, source_dir: str):
+    """Zip a directory with sorted entries and fixed timestamps"""
+    entries = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            entries.append((file_path, os.path.relpath(file_path, source_dir).replace(os.sep, "/")))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as zipf:
+        for file_path, arcname in entries:
+            info = zipfile.ZipInfo(arcname, ZIP_DATE)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(file_path, "rb") as f:
+                zipf.writestr(info, f.read())
+
+
+def build_function():
+    """Application code, precompiled, plus the data directory with the resource snapshot"""
+    if os.path.exists("lambda-package"):
+        shutil.rmtree("lambda-package")
+    os.makedirs("lambda-package")
+
     print("Copying application files...")
-    for file in ["server.py", "lambda_handler.py", "context.py", "resources.py", "security.py"]:
+    for file in APP_FILES:
         if os.path.exists(file):
             shutil.copy2(file, "lambda-package/")
-    
-    # Copy data directory
+
+    # Copy data directory; the PDFs are replaced by pre-extracted snapshots, one per persona
     if os.path.exists("data"):
-        shutil.copytree("data", "lambda-package/data")
+        shutil.copytree("data", "lambda-package/data", ignore=shutil.ignore_patterns("*.pdf", SNAPSHOT_FILE))
+        print("Building resource snapshots...")
+        for persona_id, source in [("default", "data")] + persona_dirs():
+            target = os.path.join("lambda-package", os.path.relpath(source), SNAPSHOT_FILE)
+            content_hash = build_snapshot(source, target)
+            print(f"✓ Resource snapshot {persona_id} {content_hash[:12]}")
+
+    # .pyc files are tagged with the interpreter version, so only the runtime's version can build them
+    if sys.version_info[:2] == LAMBDA_PYTHON:
+        compileall.compile_dir(
+            "lambda-package", quiet=1, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+        )
+    else:
+        print(f"⚠ Python {sys.version_info[0]}.{sys.version_info[1]} can't precompile for the 3.12 runtime; shipping sources only")
 
-    # Create zip
     print("Creating zip file...")
-    with zipfile.ZipFile("lambda-deployment.zip", "w", zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk("lambda-package"):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, "lambda-package")
-                zipf.write(file_path, arcname)
+    write_zip(FUNCTION_ZIP, "lambda-package")
+
+
+def print_sizes(path: str, label: str, prefix: str = "") -> int:
+    """Size per top-level package of a zip (unzipped and compressed); returns the unzipped total"""
+    sizes = defaultdict(lambda: [0, 0])
+    for info in zipfile.ZipFile(path).infolist():
+        name = info.filename[len(prefix):] if info.filename.startswith(prefix) else info.filename
+        parts = name.split("/")
+        if len(parts) == 1 or parts[0] == "__pycache__":
+            # A single-module distribution, or the compiled form of one
+            top = parts[-1].split(".", 1)[0]
+        elif parts[0].endswith(".dist-info"):
+            top = "(dist-info)"
+        else:
+            top = parts[0]
+        sizes[top][0] += info.file_size
+        sizes[top][1] += info.compress_size
+    total = sum(size for size, _ in sizes.values())
+    print(f"\n{label}: {_mb(os.path.getsize(path))} MB zipped, {_mb(total)} MB unzipped")
+    for top, (size, compressed) in sorted(sizes.items(), key=lambda item: -item[1][0]):
+        print(f"  {top:<28} {_mb(size):>8} MB {_mb(compressed):>8} MB zipped")
+    return total
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Lambda layer and function packages")
+    parser.add_argument("--rebuild-layer", action="store_true", help="ignore the cached dependency layer")
+    parser.add_argument("--prepare-layer", metavar="DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.prepare_layer:
+        prepare_layer(args.prepare_layer)
+        return
+
+    print("Creating Lambda deployment package...")
+    os.makedirs(BUILD_DIR, exist_ok=True)
+
+    requirements = runtime_requirements()
+    key = layer_key(requirements)
+    cached = os.path.join(BUILD_DIR, f"layer-{key}.zip")
+    if os.path.exists(cached) and not args.rebuild_layer:
+        print(f"✓ Dependencies unchanged, reusing layer {key}")
+    else:
+        cached = build_layer(key, requirements)
+        # Older layers only take up space once requirements have moved on
+        for name in os.listdir(BUILD_DIR):
+            if name.startswith("layer-") and name.endswith(".zip") and os.path.join(BUILD_DIR, name) != cached:
+                os.remove(os.path.join(BUILD_DIR, name))
+    shutil.copyfile(cached, LAYER_ZIP)
+
+    build_function()
 
-    # Show package size
-    size_mb = os.path.getsize("lambda-deployment.zip") / (1024 * 1024)
-    print(f"✓ Created lambda-deployment.zip ({size_mb:.2f} MB)")
+    layer_total = print_sizes(LAYER_ZIP, f"✓ {LAYER_ZIP}", prefix="python/")
+    function_total = print_sizes(FUNCTION_ZIP, f"✓ {FUNCTION_ZIP}")
+    total = layer_total + function_total
+    print(f"\nUnzipped total {_mb(total)} MB of Lambda's {_mb(UNZIPPED_LIMIT)} MB limit")
+    if total > UNZIPPED_LIMIT:
+        raise SystemExit("Package exceeds the Lambda unzipped size limit")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,357 @@
+"""
+Bulk export of stored conversations for analytics
+Streams every session in S3_BUCKET (or MEMORY_DIR) into columnar part files, one
+row per message, and prints a summary: sessions, token usage by role, language
+split and the most frequent visitor questions.
+
+Sessions are listed page by page and loaded a few at a time in parallel, so the
+corpus is never held in memory. After each part file the position in the listing
+and the running summary are saved to a checkpoint; an interrupted run picks up
+where it stopped.
+
+Output is Parquet when pyarrow is installed (`uv sync --extra export`), CSV otherwise.
+
+Usage (from backend/):
+    python export.py --output exports/2025-03      # S3_BUCKET if USE_S3=true, else MEMORY_DIR
+    python export.py --memory-dir ../memory --output exports/local --format csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+
+from response_cache import normalize_question
+from storage import LocalStore, S3Store
+
+CHECKPOINT_FILE = "_checkpoint.json"
+CHECKPOINT_VERSION = 1
+
+COLUMNS = ("session_id", "position", "role", "timestamp", "tokens", "language", "chars", "content")
+
+# Distinct questions kept in the summary; the rarest are dropped past this
+QUESTION_LIMIT = 5000
+
+# Function words that tell French and English apart (compared after normalize_question)
+FRENCH_WORDS = frozenset("""
+au aux avec ce ces comment dans de des du elle est et etait etes il je la le les leur mais
+mes moi mon ne nous ou par pas peux peut pour pourquoi quel quelle quels que qui sont sur
+ta tes toi ton tu un une vos votre vous
+""".split())
+ENGLISH_WORDS = frozenset("""
+about and are did do does for from have how i in is it me my of on or please tell that
+the this to was were what when where which who why with would you your
+""".split())
+
+_WORD = re.compile(r"[a-z']+")
+
+
+def detect_language(text: str) -> str:
+    """'fr', 'en' or 'unknown', by counting French and English function words"""
+    words = _WORD.findall(normalize_question(text))
+    french = sum(w in FRENCH_WORDS for w in words)
+    english = sum(w in ENGLISH_WORDS for w in words)
+    if french == english:
+        return "unknown"
+    return "fr" if french > english else "en"
+
+
+def list_local_sessions(directory: str, start_after: str = "") -> Iterator[str]:
+    """Session ids of a MEMORY_DIR in sorted order"""
+    names = sorted(
+        entry.name.rsplit(".", 1)[0]
+        for entry in os.scandir(directory)
+        if entry.is_file() and entry.name.endswith((".jsonl", ".json"))
+    )
+    previous = None
+    for session_id in names:
+        # A session being migrated can have both a .json and a .jsonl file
+        if session_id != previous and session_id > start_after:
+            yield session_id
+        previous = session_id
+
+
+def list_s3_sessions(client, bucket: str, start_after: str = "") -> Iterator[str]:
+    """Session ids of a bucket in key order, one listing page at a time"""
+    paginator = client.get_paginator("list_objects_v2")
+    kwargs = {"Bucket": bucket, "Delimiter": "/"}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    previous = start_after
+    for page in paginator.paginate(**kwargs):
+        # Sessions are "{id}/" prefixes, or "{id}.json" objects written by earlier versions
+        ids = [prefix["Prefix"][:-1] for prefix in page.get("CommonPrefixes", [])]
+        ids += [obj["Key"][:-5] for obj in page.get("Contents", []) if obj["Key"].endswith(".json")]
+        for session_id in sorted(ids):
+            if session_id != previous:
+                yield session_id
+            previous = session_id
+
+
+def load_sessions(
+    load: Callable[[str], Tuple[List[Dict], int]], session_ids: Iterable[str], workers: int
+) -> Iterator[Tuple[str, Optional[List[Dict]]]]:
+    """
+    Yield (session_id, messages) in listing order, loading up to `workers` sessions ahead.
+    messages is None when a session could not be loaded.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+        pending = deque()
+        for session_id in session_ids:
+            pending.append((session_id, pool.submit(load, session_id)))
+            if len(pending) >= workers * 2:
+                yield _result(*pending.popleft())
+        while pending:
+            yield _result(*pending.popleft())
+
+
+def _result(session_id: str, future) -> Tuple[str, Optional[List[Dict]]]:
+    try:
+        return session_id, future.result()[0]
+    except Exception as e:
+        print(f"Skipping {session_id}: {e}")
+        return session_id, None
+
+
+def message_rows(session_id: str, messages: List[Dict]) -> Iterator[Dict]:
+    for position, message in enumerate(messages):
+        content = message.get("content") or ""
+        yield {
+            "session_id": session_id,
+            "position": position,
+            "role": message.get("role"),
+            "timestamp": message.get("timestamp"),
+            "tokens": message.get("tokens"),
+            "language": detect_language(content) if message.get("role") == "user" else None,
+            "chars": len(content),
+            "content": content,
+        }
+
+
+class Summary:
+    """Running totals, saved in the checkpoint so a resumed run reports on everything"""
+
+    def __init__(self, state: Optional[Dict] = None):
+        state = state or {}
+        self.sessions = state.get("sessions", 0)
+        self.messages = state.get("messages", 0)
+        self.tokens = Counter(state.get("tokens", {}))
+        self.languages = Counter(state.get("languages", {}))
+        self.questions = Counter(state.get("questions", {}))
+        self.failed: List[str] = state.get("failed", [])
+
+    def add(self, rows: List[Dict]):
+        self.sessions += 1
+        self.messages += len(rows)
+        for row in rows:
+            self.tokens[row["role"]] += row["tokens"] or 0
+            if row["role"] == "user":
+                self.languages[row["language"]] += 1
+                question = normalize_question(row["content"] or "")
+                if question:
+                    self.questions[question] += 1
+        if len(self.questions) > QUESTION_LIMIT * 2:
+            self.questions = Counter(dict(self.questions.most_common(QUESTION_LIMIT)))
+
+    def state(self) -> Dict:
+        return {
+            "sessions": self.sessions,
+            "messages": self.messages,
+            "tokens": dict(self.tokens),
+            "languages": dict(self.languages),
+            "questions": dict(self.questions.most_common(QUESTION_LIMIT)),
+            "failed": self.failed,
+        }
+
+    def report(self, top: int) -> str:
+        users = sum(self.languages.values()) or 1
+        lines = [
+            f"Sessions: {self.sessions} ({len(self.failed)} skipped)",
+            f"Messages: {self.messages}",
+            "Tokens: " + ", ".join(f"{role} {count}" for role, count in sorted(self.tokens.items())),
+            "Languages: " + ", ".join(
+                f"{language} {count / users:.0%}" for language, count in self.languages.most_common()
+            ),
+            f"Top {top} questions:",
+        ]
+        lines += [f"  {count:>6}  {question}" for question, count in self.questions.most_common(top)]
+        return "\n".join(lines)
+
+
+def write_part(directory: str, part: int, rows: List[Dict], fmt: str) -> str:
+    """Write one part file atomically and return its path"""
+    path = os.path.join(directory, f"part-{part:05d}.{fmt}")
+    temporary = path + ".tmp"
+    if fmt == "parquet":
+        table = pa.Table.from_pylist(rows, schema=_arrow_schema())
+        pq.write_table(table, temporary, compression="zstd")
+    else:
+        with open(temporary, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(temporary, path)
+    return path
+
+
+def _arrow_schema():
+    return pa.schema([
+        ("session_id", pa.string()),
+        ("position", pa.int32()),
+        ("role", pa.dictionary(pa.int8(), pa.string())),
+        ("timestamp", pa.string()),
+        ("tokens", pa.int32()),
+        ("language", pa.dictionary(pa.int8(), pa.string())),
+        ("chars", pa.int32()),
+        ("content", pa.string()),
+    ])
+
+
+def read_checkpoint(directory: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directory, CHECKPOINT_FILE), "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise SystemExit(f"Checkpoint in {directory} has another version; rerun with --restart")
+    return checkpoint
+
+
+def write_checkpoint(directory: str, checkpoint: Dict):
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": CHECKPOINT_VERSION, **checkpoint}, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def export(
+    store,
+    session_ids: Callable[[str], Iterator[str]],
+    output: str,
+    fmt: str,
+    batch: int,
+    workers: int,
+    with_content: bool = True,
+    restart: bool = False,
+) -> Summary:
+    """
+    Export every session listed by session_ids(start_after) into part files under output.
+    Each part holds `batch` sessions and is followed by a checkpoint, so a rerun
+    resumes after the last completed part.
+    """
+    os.makedirs(output, exist_ok=True)
+    checkpoint = None if restart else read_checkpoint(output)
+    if checkpoint is None:
+        # Parts of an earlier run would mix with the new ones
+        for name in os.listdir(output):
+            if name.startswith("part-"):
+                os.remove(os.path.join(output, name))
+        checkpoint = {"format": fmt, "after": "", "parts": 0, "done": False, "summary": {}}
+    elif checkpoint["format"] != fmt:
+        raise SystemExit(f"{output} holds {checkpoint['format']} parts; rerun with --format {checkpoint['format']}")
+
+    summary = Summary(checkpoint["summary"])
+    if checkpoint["done"]:
+        print(f"{output} is already complete ({checkpoint['parts']} parts); use --restart to export again")
+        return summary
+    if checkpoint["after"]:
+        print(f"Resuming after {checkpoint['after']} ({summary.sessions} sessions, {checkpoint['parts']} parts)")
+
+    rows: List[Dict] = []
+    sessions_in_part = 0
+    last = checkpoint["after"]
+
+    def flush(done: bool):
+        nonlocal rows, sessions_in_part
+        if rows:
+            path = write_part(output, checkpoint["parts"], rows, fmt)
+            checkpoint["parts"] += 1
+            print(f"✓ {path}: {sessions_in_part} sessions, {len(rows)} messages")
+        checkpoint.update(after=last, done=done, summary=summary.state())
+        write_checkpoint(output, checkpoint)
+        rows, sessions_in_part = [], 0
+
+    for session_id, messages in load_sessions(store.load, session_ids(last), workers):
+        last = session_id
+        sessions_in_part += 1
+        if messages is None:
+            summary.failed.append(session_id)
+        else:
+            session_rows = list(message_rows(session_id, messages))
+            summary.add(session_rows)
+            if not with_content:
+                for row in session_rows:
+                    row["content"] = None
+            rows.extend(session_rows)
+        if sessions_in_part >= batch:
+            flush(done=False)
+    flush(done=True)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", required=True, help="directory for the part files and checkpoint")
+    parser.add_argument("--bucket", help="S3 bucket to export (default: S3_BUCKET when USE_S3=true)")
+    parser.add_argument("--memory-dir", help="local conversation directory to export (default: MEMORY_DIR)")
+    parser.add_argument("--format", choices=("parquet", "csv"), help="default: parquet if pyarrow is installed")
+    parser.add_argument("--batch", type=int, default=500, help="sessions per part file and checkpoint")
+    parser.add_argument("--workers", type=int, default=16, help="sessions loaded in parallel")
+    parser.add_argument("--top", type=int, default=20, help="questions listed in the summary")
+    parser.add_argument("--no-content", action="store_true", help="leave message text out of the part files")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and export from the start")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+    fmt = args.format or ("parquet" if pa is not None else "csv")
+    if fmt == "parquet" and pa is None:
+        raise SystemExit("Parquet output needs pyarrow: uv sync --extra export, or use --format csv")
+
+    bucket = args.bucket
+    if not bucket and not args.memory_dir and os.environ.get("USE_S3", "false").lower() == "true":
+        bucket = os.environ["S3_BUCKET"]
+    if bucket:
+        import boto3
+
+        from io_pool import client_config
+
+        # Each loading session may fetch several turn objects at once
+        client = boto3.client("s3", config=client_config(args.workers * 2))
+        store = S3Store(bucket, lambda: client)
+        session_ids = lambda after: list_s3_sessions(client, bucket, after)
+        print(f"Exporting s3://{bucket} to {args.output} ({fmt})")
+    else:
+        directory = args.memory_dir or os.environ.get("MEMORY_DIR", "../memory")
+        store = LocalStore(directory)
+        session_ids = lambda after: list_local_sessions(directory, after)
+        print(f"Exporting {directory} to {args.output} ({fmt})")
+
+    summary = export(
+        store,
+        session_ids,
+        args.output,
+        fmt,
+        batch=args.batch,
+        workers=args.workers,
+        with_content=not args.no_content,
+        restart=args.restart,
+    )
+    print(summary.report(args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Import-time profiler for cold starts
+Records per-module import time (self and cumulative, like `python -X importtime`)
+through a meta path hook and emits it as structured JSON log lines.
+Enabled with IMPORT_PROFILE=true; meant to be switched on while investigating
+cold starts, not left on.
+"""
+
+import json
+import os
+import sys
+import time
+from importlib.abc import MetaPathFinder
+from typing import Dict, List, Tuple
+
+IMPORT_PROFILE = os.environ.get("IMPORT_PROFILE", "false").lower() == "true"
+
+# Number of slowest modules reported per cold start
+IMPORT_PROFILE_TOP = int(os.environ.get("IMPORT_PROFILE_TOP", "25"))
+
+_records: List[Dict] = []
+_stack: List[List[float]] = []
+# Modules whose import is in progress: name -> (start time, frame)
+_open: Dict[str, Tuple[float, List[float]]] = {}
+_timed_classes: Dict[type, type] = {}
+
+
+def _begin(name: str):
+    # Each frame accumulates the cumulative time of its child imports
+    frame = [0.0]
+    _stack.append(frame)
+    _open[name] = (time.perf_counter(), frame)
+
+
+def _end(name: str):
+    opened = _open.pop(name, None)
+    if opened is None:
+        return
+    start, frame = opened
+    cumulative = time.perf_counter() - start
+    # Normally the top frame; an import that failed midway may have left frames above it
+    for index in range(len(_stack) - 1, -1, -1):
+        if _stack[index] is frame:
+            del _stack[index:]
+            break
+    if _stack:
+        _stack[-1][0] += cumulative
+    _records.append({
+        "module": name,
+        "self_us": int((cumulative - frame[0]) * 1_000_000),
+        "cumulative_us": int(cumulative * 1_000_000),
+        "depth": len(_stack),
+    })
+
+
+def _timed_class(cls: type) -> type:
+    """
+    Subclass of a loader class that times create_module (where extension modules
+    are loaded and initialised) through the end of exec_module. Being a subclass,
+    the loader still passes isinstance checks and type-keyed registries.
+    """
+    timed = _timed_classes.get(cls)
+    if timed is None:
+
+        def create_module(self, spec):
+            _begin(spec.name)
+            try:
+                create = getattr(super(timed, self), "create_module", None)
+                return create(spec) if create is not None else None
+            except BaseException:
+                _end(spec.name)
+                raise
+
+        def exec_module(self, module):
+            name = module.__spec__.name if module.__spec__ is not None else module.__name__
+            if name not in _open:
+                _begin(name)
+            try:
+                super(timed, self).exec_module(module)
+            finally:
+                _end(name)
+
+        timed = _timed_classes[cls] = type(
+            cls.__name__,
+            (cls,),
+            {"__slots__": (), "__module__": cls.__module__, "create_module": create_module, "exec_module": exec_module},
+        )
+    return timed
+
+
+class _TimingFinder(MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            loader = spec.loader
+            # Class-level importers (builtin, frozen) are left alone
+            if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+                try:
+                    loader.__class__ = _timed_class(type(loader))
+                except TypeError:
+                    # Loaders with an incompatible instance layout stay untimed
+                    pass
+            return spec
+        return None
+
+
+_finder = _TimingFinder()
+
+
+def install():
+    """Start recording imports (no-op unless IMPORT_PROFILE is set)"""
+    if IMPORT_PROFILE and _finder not in sys.meta_path:
+        sys.meta_path.insert(0, _finder)
+
+
+def uninstall():
+    if _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
+
+
+def emit(phase: str, duration: float):
+    """
+    Log the slowest imports recorded so far plus a summary line, then reset.
+    Each line is a JSON object tagged with the Lambda function version.
+    """
+    if not IMPORT_PROFILE:
+        return
+    release = os.environ.get("AWS_LAMBDA_FUNCTION_VERSION", "local")
+    slowest = sorted(_records, key=lambda r: r["cumulative_us"], reverse=True)[:IMPORT_PROFILE_TOP]
+    for record in slowest:
+        print(json.dumps({"event": "import_time", "phase": phase, "release": release, **record}))
+    print(json.dumps({
+        "event": "init_duration",
+        "phase": phase,
+        "release": release,
+        "duration_ms": round(duration * 1000, 2),
+        "modules_imported": len(_records),
+    }))
+    _records.clear()
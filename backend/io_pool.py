@@ -0,0 +1,44 @@
+"""
+Bounded thread-pool offload for blocking boto3 calls
+Keeps Bedrock and S3 round trips off the event loop so one slow reply
+does not stall every other request served by the worker.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Maximum number of concurrent in-flight calls per upstream
+BEDROCK_CONCURRENCY = int(os.environ.get("BEDROCK_CONCURRENCY", "16"))
+S3_CONCURRENCY = int(os.environ.get("S3_CONCURRENCY", "32"))
+
+_bedrock_executor = ThreadPoolExecutor(max_workers=BEDROCK_CONCURRENCY, thread_name_prefix="bedrock")
+_s3_executor = ThreadPoolExecutor(max_workers=S3_CONCURRENCY, thread_name_prefix="s3")
+
+
+def client_config(max_connections: int):
+    """botocore config with a connection pool sized to the offload limit"""
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=max_connections,
+        tcp_keepalive=True,
+        retries={"max_attempts": 3, "mode": "standard"},
+    )
+
+
+async def _run(executor: ThreadPoolExecutor, fn: Callable, *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_bedrock(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking Bedrock call in the bounded Bedrock pool"""
+    return await _run(_bedrock_executor, fn, *args, **kwargs)
+
+
+async def run_s3(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking storage call in the bounded S3 pool"""
+    return await _run(_s3_executor, fn, *args, **kwargs)
@@ -1,5 +1,100 @@
-from mangum import Mangum
-from server import app
+import time
 
-# Create the Lambda handler
-handler = Mangum(app)
\ No newline at end of file
+_init_start = time.perf_counter()
+
+import json
+import os
+
+import import_profile
+
+import_profile.install()
+
+# In fast-startup mode FastAPI, Mangum and the server module are imported on the
+# first request that needs them instead of during the Lambda init phase
+FAST_STARTUP = os.environ.get("FAST_STARTUP", "true").lower() == "true"
+
+# Provisioned containers are initialized before any visitor arrives, so they warm up during init
+INITIALIZATION_TYPE = os.environ.get("AWS_LAMBDA_INITIALIZATION_TYPE", "on-demand")
+
+_handler = None
+
+# Invocations served by this container; the first one after init is the cold start
+_invocations = 0
+_warm = False
+
+
+def _app_handler():
+    """Create the Mangum handler on first use"""
+    global _handler
+    if _handler is None:
+        start = time.perf_counter()
+        from mangum import Mangum
+        from server import app
+
+        # Create the Lambda handler
+        _handler = Mangum(app)
+        import_profile.emit("app", time.perf_counter() - start)
+    return _handler
+
+
+def _is_health_check(event) -> bool:
+    path = event.get("rawPath") or event.get("path")
+    method = event.get("requestContext", {}).get("http", {}).get("method") or event.get("httpMethod")
+    return method == "GET" and path in ("/", "/health")
+
+
+def _is_warm_up(event) -> bool:
+    # {"warmup": true} from the keep-alive schedule, or a plain EventBridge scheduled event
+    return event.get("warmup") is True or (
+        event.get("source") == "aws.events" and event.get("detail-type") == "Scheduled Event"
+    )
+
+
+def _warm_up() -> dict:
+    """Load the app and open upstream connections once per container; returns the step timings"""
+    global _warm
+    if _warm:
+        return {}
+    _app_handler()
+    from server import warm_up
+
+    timings = warm_up()
+    _warm = True
+    return timings
+
+
+def handler(event, context):
+    global _invocations
+    _invocations += 1
+    cold = _invocations == 1
+    start = time.perf_counter()
+    kind = "warmup" if _is_warm_up(event) else "health" if _is_health_check(event) else "request"
+    try:
+        if kind == "warmup":
+            # Answered here, not by the app: later pings only keep the container alive
+            return {"status": "warm", "cold": cold, "invocations": _invocations, "timings_ms": _warm_up()}
+        if kind == "health":
+            # Health pings are answered without loading the web stack
+            return {
+                "statusCode": 200,
+                "headers": {"content-type": "application/json"},
+                "body": json.dumps({"status": "ok"}),
+            }
+        return _app_handler()(event, context)
+    finally:
+        # One line per invocation; the cold/warm report in CloudWatch Logs Insights counts these
+        print(json.dumps({
+            "event": "invocation",
+            "kind": kind,
+            "cold": cold,
+            "init_type": INITIALIZATION_TYPE,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        }))
+
+
+if INITIALIZATION_TYPE == "provisioned-concurrency":
+    _warm_up()
+elif not FAST_STARTUP:
+    _app_handler()
+
+import_profile.emit("init", time.perf_counter() - _init_start)
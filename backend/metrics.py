@@ -0,0 +1,284 @@
+"""
+In-process latency and token metrics
+Hot-path timings go into fixed-bucket histograms (one bisect and three adds
+per observation). The registry renders Prometheus text for /metrics and, when
+METRICS_EMF is set, periodically logs CloudWatch Embedded Metric Format (EMF)
+lines so Lambda metrics need no agent or API call.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_EMF = os.environ.get("METRICS_EMF", "false").lower() == "true"
+# Seconds between EMF log lines (each line carries the deltas since the last one)
+METRICS_EMF_INTERVAL = float(os.environ.get("METRICS_EMF_INTERVAL", "60"))
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "DigitalTwin")
+
+# Bucket upper bounds: latency in seconds from 100 us to 60 s, tokens per request
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("bounds", "unit", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...], unit: str = "Seconds"):
+        self.bounds = bounds
+        # CloudWatch unit of the observed values
+        self.unit = unit
+        # One slot per bound plus the overflow (+Inf) bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q: float) -> float:
+        """Estimate by linear interpolation inside the bucket holding the q-th observation"""
+        counts, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, n in enumerate(counts):
+            if n and seen + n >= rank:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _Timer:
+    """Context manager that records its duration in a histogram"""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+class Registry:
+    """
+    Named metric families, each holding one series per label set.
+    Collectors are read only when metrics are rendered, for values that other
+    components already count (cache hits, queue depth, ...).
+    """
+
+    def __init__(self):
+        self._families: Dict[str, Tuple[str, str, Dict[Labels, object]]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict, float]]]] = []
+        self._lock = threading.Lock()
+        self._emitted: Dict[Tuple[str, Labels], object] = {}
+        self._next_emit = time.monotonic() + METRICS_EMF_INTERVAL
+
+    def _series(self, kind: str, name: str, help_text: str, labels: Dict, factory: Callable):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help_text, {}))
+            series = family[2].get(key)
+            if series is None:
+                series = family[2][key] = factory()
+            return series
+
+    def histogram(
+        self, name: str, help_text: str, bounds: Tuple[float, ...] = LATENCY_BUCKETS, unit: str = "Seconds", **labels
+    ) -> Histogram:
+        return self._series("histogram", name, help_text, labels, lambda: Histogram(bounds, unit))
+
+    def counter(self, name: str, help_text: str, **labels) -> Counter:
+        return self._series("counter", name, help_text, labels, Counter)
+
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Dict, float]]]):
+        """Register collect() -> [(name, "counter" | "gauge", help, labels, value), ...]"""
+        self._collectors.append(collect)
+
+    def _collected(self) -> Dict[str, Tuple[str, str, List[Tuple[Dict, float]]]]:
+        families: Dict[str, Tuple[str, str, List[Tuple[Dict, float]]]] = {}
+        for collect in self._collectors:
+            for name, kind, help_text, labels, value in collect():
+                families.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+        return families
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            families = [(name, kind, help_text, dict(series)) for name, (kind, help_text, series) in self._families.items()]
+        for name, kind, help_text, series in sorted(families):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in series.items():
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {_number(metric.value)}")
+                    continue
+                counts, total, count = metric.snapshot()
+                cumulative = 0
+                for bound, n in zip(metric.bounds + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+            if kind == "histogram":
+                # Precomputed percentiles for dashboards that don't run histogram_quantile()
+                lines.append(f"# HELP {name}_quantile Estimated percentiles of {name}")
+                lines.append(f"# TYPE {name}_quantile gauge")
+                for labels, metric in series.items():
+                    for q in QUANTILES:
+                        lines.append(f"{name}_quantile{_labels(labels + (('quantile', str(q)),))} {_number(metric.quantile(q))}")
+        for name, (kind, help_text, values) in sorted(self._collected().items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in values:
+                lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def maybe_emit(self):
+        """Log EMF lines if METRICS_EMF is set and the interval has passed"""
+        if not METRICS_EMF:
+            return
+        now = time.monotonic()
+        if now < self._next_emit:
+            return
+        self._next_emit = now + METRICS_EMF_INTERVAL
+        self.emit()
+
+    def emit(self):
+        """Log one EMF line per series with the changes since the previous emit"""
+        timestamp = int(time.time() * 1000)
+        with self._lock:
+            families = [(name, kind, dict(series)) for name, (kind, _, series) in self._families.items()]
+        for name, kind, series in families:
+            for labels, metric in series.items():
+                if kind == "counter":
+                    value = metric.value
+                    delta = value - self._emitted.get((name, labels), 0.0)
+                    self._emitted[(name, labels)] = value
+                    if delta:
+                        _print_emf(timestamp, name, labels, "Count", delta)
+                    continue
+                counts = metric.snapshot()[0]
+                previous = self._emitted.get((name, labels)) or [0] * len(counts)
+                self._emitted[(name, labels)] = counts
+                values, weights = [], []
+                for index, (now_n, then_n) in enumerate(zip(counts, previous)):
+                    if now_n > then_n:
+                        values.append(_bucket_value(metric.bounds, index))
+                        weights.append(now_n - then_n)
+                if values:
+                    _print_emf(timestamp, name, labels, metric.unit, {"Values": values, "Counts": weights})
+        for name, (kind, _, values) in self._collected().items():
+            for labels, value in values:
+                labels = tuple(sorted(labels.items()))
+                if kind == "counter":
+                    # Collected counters are running totals; CloudWatch wants the increase
+                    previous = self._emitted.get((name, labels), 0)
+                    self._emitted[(name, labels)] = value
+                    if value > previous:
+                        _print_emf(timestamp, name, labels, "Count", value - previous)
+                else:
+                    _print_emf(timestamp, name, labels, "None", value)
+
+
+def _bucket_value(bounds: Tuple[float, ...], index: int) -> float:
+    """Representative value of a bucket: its midpoint, or the last bound for the overflow bucket"""
+    if index == len(bounds):
+        return bounds[-1]
+    lower = bounds[index - 1] if index else 0.0
+    return (lower + bounds[index]) / 2
+
+
+def _print_emf(timestamp: int, name: str, labels: Labels, unit: str, value):
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": timestamp,
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [[key for key, _ in labels]],
+                "Metrics": [{"Name": name, "Unit": unit}],
+            }],
+        },
+        **dict(labels),
+        name: value,
+    }))
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+_stages: Dict[str, Histogram] = {}
+
+
+def stage(name: str):
+    """Time a block as one stage of request handling: `with stage("bedrock"): ...`"""
+    if not METRICS_ENABLED:
+        return _NO_TIMER
+    histogram = _stages.get(name)
+    if histogram is None:
+        histogram = _stages[name] = registry.histogram(
+            "twin_stage_seconds", "Time spent in each stage of request handling", stage=name
+        )
+    return _Timer(histogram)
@@ -0,0 +1,138 @@
+"""
+Personas served by one deployment
+A request's persona_id selects a resource bundle: data/ for the default persona,
+data/personas/{id}/ for the others. Each bundle is loaded and its system prompt
+rendered once, then kept in an LRU bounded by an estimate of retained bytes, so a
+warm instance serves many twins without paying their init cost again. The
+default persona is never evicted.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import context
+import resources
+
+DEFAULT_PERSONA = os.environ.get("DEFAULT_PERSONA", "default")
+# Byte budget for the bundles of non-default personas
+PERSONA_CACHE_BYTES = int(os.environ.get("PERSONA_CACHE_BYTES", str(16 * 1024 * 1024)))
+
+_PERSONA_ID = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+class UnknownPersona(Exception):
+    """No resource bundle exists for this persona id"""
+
+
+class Persona:
+    """A persona's resources and its precompiled system prompt"""
+
+    __slots__ = ("id", "resources", "content_hash", "static_prompt", "prompt_hash", "size")
+
+    def __init__(self, persona_id: str, bundle: Dict, content_hash: str, static_prompt: str):
+        self.id = persona_id
+        self.resources = bundle
+        self.content_hash = content_hash
+        self.static_prompt = static_prompt
+        self.prompt_hash = context.hash_prompt(static_prompt)
+        # Rough footprint: the prompt plus the resources it was rendered from
+        self.size = 2 * (len(static_prompt) + len(json.dumps(bundle, ensure_ascii=False)))
+
+    def system_blocks(self, cache_point: bool = True) -> List[Dict]:
+        return context.system_blocks(cache_point, self.static_prompt)
+
+
+def persona_dir(persona_id: str) -> str:
+    if persona_id == DEFAULT_PERSONA:
+        return resources.DATA_DIR
+    return os.path.join(resources.PERSONAS_DIR, persona_id)
+
+
+class PersonaCache:
+    def __init__(self, max_bytes: int = PERSONA_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._default = None
+        self._entries: "OrderedDict[str, Persona]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Loads are rare; one at a time keeps concurrent first requests from loading twice
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, persona_id: str) -> Persona:
+        """The persona's bundle, loading it on first use; raises UnknownPersona"""
+        persona = self.cached(persona_id)
+        return persona if persona is not None else self.load(persona_id)
+
+    def cached(self, persona_id: str) -> Optional[Persona]:
+        """The persona if it is already loaded, without any I/O; raises UnknownPersona for a malformed id"""
+        if persona_id == DEFAULT_PERSONA:
+            return self._default
+        if not _PERSONA_ID.match(persona_id):
+            raise UnknownPersona(persona_id)
+        return self._lookup(persona_id)
+
+    def load(self, persona_id: str) -> Persona:
+        """Load a persona's bundle (blocking file reads); raises UnknownPersona"""
+        if persona_id == DEFAULT_PERSONA:
+            if self._default is None:
+                with self._load_lock:
+                    if self._default is None:
+                        # Shares the default prompt other modules render through context
+                        self._default = Persona(
+                            DEFAULT_PERSONA, resources.load(), resources.content_hash(), context.static_prompt()
+                        )
+            return self._default
+
+        if not _PERSONA_ID.match(persona_id):
+            raise UnknownPersona(persona_id)
+        directory = persona_dir(persona_id)
+        # Checked before the lock so unknown ids never queue behind a real load
+        if not os.path.isfile(os.path.join(directory, "facts.json")):
+            raise UnknownPersona(persona_id)
+        with self._load_lock:
+            persona = self._lookup(persona_id, count=False)
+            if persona is not None:
+                return persona
+            bundle, content_hash = resources.load_bundle(directory)
+            persona = Persona(persona_id, bundle, content_hash, context.render_prompt(bundle))
+            self._put(persona)
+        return persona
+
+    def _lookup(self, persona_id: str, count: bool = True):
+        with self._lock:
+            persona = self._entries.get(persona_id)
+            if persona is not None:
+                self._entries.move_to_end(persona_id)
+            if count:
+                if persona is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return persona
+
+    def _put(self, persona: Persona):
+        with self._lock:
+            self._entries[persona.id] = persona
+            self._bytes += persona.size
+            # The newest bundle stays even if it alone exceeds the budget
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "personas": len(self._entries),
+                "bytes": self._bytes,
+            }
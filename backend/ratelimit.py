@@ -0,0 +1,405 @@
+"""
+Rate limiting and token budget shared across instances
+Counters live in a pluggable backend (in-process memory, SQLite for a single
+node, or DynamoDB across Lambda containers). Remote backends stay off the hot
+path: per-IP increments are synced in the background and the token budget is
+leased from the shared counter in blocks.
+"""
+
+import asyncio
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+# Counter backend selection: memory, sqlite or dynamodb
+LIMITER_BACKEND = os.environ.get("LIMITER_BACKEND", "memory").lower()
+LIMITER_SQLITE_PATH = os.environ.get("LIMITER_SQLITE_PATH", "/tmp/twin-limits.db")
+LIMITER_TABLE = os.environ.get("LIMITER_TABLE", "")
+
+# Tokens taken from the shared budget per lease
+TOKEN_LEASE_SIZE = int(os.environ.get("TOKEN_LEASE_SIZE", "3000"))
+
+# Hard cap on keys tracked by the in-process rate limiter (least recently seen are evicted)
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class CounterBackend(ABC):
+    """Atomic counters bucketed by fixed time window"""
+
+    # Counts are visible to other processes
+    shared = True
+    # Remote backends cost a network round trip per call
+    remote = False
+
+    @abstractmethod
+    def incr(self, key: str, window: int, amount: int, ttl: int) -> int:
+        """Add amount to the counter for (key, window) and return its new value"""
+
+    def warm_up(self):
+        """Open the connection to the store ahead of the first request"""
+
+
+class MemoryBackend(CounterBackend):
+    """Per-process counters; limits apply to each instance separately"""
+
+    shared = False
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def incr(self, key: str, window: int, amount: int, ttl: int) -> int:
+        now = time.time()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._counters = {k: v for k, v in self._counters.items() if v[1] > now}
+                self._next_sweep = now + ttl
+            value = self._counters.get((key, window), (0, 0.0))[0] + amount
+            self._counters[(key, window)] = (value, now + ttl)
+            return value
+
+
+class SQLiteBackend(CounterBackend):
+    """Counters in a SQLite file, shared by every worker process on one node"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            "key TEXT NOT NULL, window INTEGER NOT NULL, value INTEGER NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (key, window))"
+        )
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def incr(self, key: str, window: int, amount: int, ttl: int) -> int:
+        now = time.time()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._conn.execute("DELETE FROM counters WHERE expires_at < ?", (now,))
+                self._next_sweep = now + ttl
+            # A single upsert is atomic across processes
+            row = self._conn.execute(
+                "INSERT INTO counters (key, window, value, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key, window) DO UPDATE SET value = value + excluded.value "
+                "RETURNING value",
+                (key, window, amount, now + ttl),
+            ).fetchone()
+            return row[0]
+
+
+class DynamoDBBackend(CounterBackend):
+    """Counters in a DynamoDB table (partition key "pk", TTL attribute "expires_at")"""
+
+    remote = True
+
+    def __init__(self, table: str, client=None):
+        self.table = table
+        self._client = client
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+
+                    self._client = boto3.client("dynamodb")
+        return self._client
+
+    def incr(self, key: str, window: int, amount: int, ttl: int) -> int:
+        response = self._get_client().update_item(
+            TableName=self.table,
+            Key={"pk": {"S": f"{key}#{window}"}},
+            UpdateExpression="ADD #value :amount SET #expires = if_not_exists(#expires, :expires)",
+            ExpressionAttributeNames={"#value": "value", "#expires": "expires_at"},
+            ExpressionAttributeValues={
+                ":amount": {"N": str(amount)},
+                ":expires": {"N": str(int(time.time()) + ttl)},
+            },
+            ReturnValues="UPDATED_NEW",
+        )
+        return int(response["Attributes"]["value"]["N"])
+
+    def warm_up(self):
+        # A read that leaves the counters untouched but sets up the TLS connection
+        self._get_client().describe_table(TableName=self.table)
+
+
+def create_backend() -> CounterBackend:
+    """Build the counter backend selected by LIMITER_BACKEND"""
+    if LIMITER_BACKEND == "sqlite":
+        return SQLiteBackend(LIMITER_SQLITE_PATH)
+    if LIMITER_BACKEND == "dynamodb":
+        if not LIMITER_TABLE:
+            raise ValueError("LIMITER_TABLE is required when LIMITER_BACKEND=dynamodb")
+        return DynamoDBBackend(LIMITER_TABLE)
+    return MemoryBackend()
+
+
+# Background pool for syncing counters with remote backends
+_sync_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="limiter")
+
+
+class _KeyWindow:
+    """Sliding-window state for one key"""
+
+    __slots__ = ("index", "previous", "shared", "sent", "acked")
+
+    def __init__(self, index: int):
+        self.index = index
+        # Count for the window before `index`
+        self.previous = 0.0
+        # Last shared total seen from the backend
+        self.shared = 0
+        # Increments made by this instance, and how many the backend has counted
+        self.sent = 0
+        self.acked = 0
+
+    def current(self) -> int:
+        return self.shared + self.sent - self.acked
+
+    def roll(self, index: int):
+        self.previous = self.current() if index == self.index + 1 else 0.0
+        self.index = index
+        self.shared = self.sent = self.acked = 0
+
+
+class RateLimiter:
+    """
+    Sliding-window request limit per key, approximated from two fixed windows:
+    count = previous * (1 - elapsed fraction of current window) + current.
+    Each check is constant time. Keys live in an LRU capped at max_keys, and
+    idle keys are evicted from the cold end as their windows expire.
+    Shared backends are incremented inline (SQLite) or in the background
+    (remote), and the decision uses the last known shared count plus this
+    instance's increments that are still in flight.
+    """
+
+    def __init__(self, backend: CounterBackend, limit: int, window: int, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.backend = backend
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[str, _KeyWindow]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def allow(self, key: str) -> bool:
+        """Count a request for key and return False if it exceeds the limit"""
+        now = time.time()
+        index = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                state = self._keys[key] = _KeyWindow(index)
+                self._evict(index)
+            else:
+                self._keys.move_to_end(key)
+                if state.index != index:
+                    state.roll(index)
+
+            if state.previous * (1 - elapsed) + state.current() >= self.limit:
+                return False
+            state.sent += 1
+
+        if self.backend.remote:
+            _sync_executor.submit(self._sync, key, state, index)
+        elif self.backend.shared:
+            self._sync(key, state, index)
+        return True
+
+    def _evict(self, index: int):
+        # Drop at most a couple of expired keys per insert so the cost stays constant
+        for _ in range(2):
+            oldest = next(iter(self._keys.values()))
+            if oldest.index >= index - 1:
+                break
+            self._keys.popitem(last=False)
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+
+    def _sync(self, key: str, state: _KeyWindow, index: int):
+        try:
+            total = self.backend.incr(f"rl:{key}", index, 1, self.window * 2)
+        except Exception as e:
+            print(f"Rate limit sync failed: {e}")
+            return
+        with self._lock:
+            if state.index == index:
+                state.shared = max(state.shared, total)
+                state.acked += 1
+
+
+class TokenBudget:
+    """
+    Tokens per rolling minute shared by every instance.
+    Usage is counted per minute in the backend and smoothed like the rate
+    limiter (previous * (1 - elapsed fraction) + current), so capacity comes
+    back gradually instead of all at once when the minute turns.
+    Each instance leases blocks of tokens from the shared counter and spends
+    them locally, so the backend is only contacted once per block. Callers
+    reserve an estimate before a call and reconcile it with the actual usage.
+    Only refilling the lease reaches the backend; async callers run it in the
+    background pool so a remote round trip never blocks the event loop. If the
+    backend fails, the budget fails open to this instance's own accounting: the
+    lease is granted against the last shared total seen, so each instance still
+    keeps within the limit by itself.
+    """
+
+    window = 60
+
+    def __init__(self, backend: CounterBackend, limit: int, lease_size: int = TOKEN_LEASE_SIZE, key: str = "tokens"):
+        self.backend = backend
+        self.limit = limit
+        self.lease_size = lease_size
+        # Backend counter name, so separate budgets (one per persona) don't share tokens
+        self.key = key
+        self._lock = threading.Lock()
+        self._index = 0
+        # Shared total of the previous window, and the last one seen for the current window
+        self._previous = 0
+        self._shared = 0
+        self._leased = 0
+        self._used = 0
+        # The previous total is the last one seen before the roll until a lease refreshes it
+        self._previous_stale = False
+        self.backend_errors = 0
+
+    def _roll(self, now: float) -> float:
+        """Move to the window containing now and return the elapsed fraction of it"""
+        index = int(now // self.window)
+        if index != self._index:
+            following = index == self._index + 1
+            self._previous = self._shared if following else 0
+            self._previous_stale = following
+            self._index = index
+            self._shared = self._leased = self._used = 0
+        return (now % self.window) / self.window
+
+    def _headroom(self, elapsed: float) -> int:
+        return int(self.limit - self._previous * (1 - elapsed) - self._shared)
+
+    def try_reserve(self, tokens: int) -> Optional[bool]:
+        """
+        Set aside tokens from this instance's lease without contacting the backend.
+        Returns True or False when that settles it, None when the lease must be refilled.
+        """
+        with self._lock:
+            elapsed = self._roll(time.time())
+            need = self._used + tokens - self._leased
+            if need <= 0:
+                self._used += tokens
+                return True
+            # The shared totals seen only grow, so a shortfall here is certain
+            if self._headroom(elapsed) < need:
+                return False
+            return None
+
+    def refill(self, tokens: int) -> bool:
+        """Lease from the shared budget, then set aside tokens (blocking: backend round trips)"""
+        with self._lock:
+            elapsed = self._roll(time.time())
+            index = self._index
+            need = self._used + tokens - self._leased
+            if need <= 0:
+                # A concurrent refill already covered it
+                self._used += tokens
+                return True
+            headroom = self._headroom(elapsed)
+            if headroom < need:
+                return False
+            request = min(max(self.lease_size, need), headroom)
+            refresh = self._previous_stale
+            previous = self._previous
+
+        # No lock held here, so other callers keep spending the current lease meanwhile
+        refreshed = None
+        if refresh:
+            # Final total of the window that just ended, including other instances
+            refreshed = self._backend_incr(index - 1, 0)
+            if refreshed is not None:
+                previous = refreshed
+        total = self._backend_incr(index, request)
+        over = 0
+        if total is not None:
+            over = min(request, max(0, int(previous * (1 - elapsed) + total - self.limit)))
+            if over:
+                # Give back what other instances took first
+                returned = self._backend_incr(index, -over)
+                total = total if returned is None else returned
+
+        with self._lock:
+            if self._index != index:
+                # The window rolled during the round trip; that lease belonged to the old one
+                return False
+            if refreshed is not None:
+                self._previous = refreshed
+                self._previous_stale = False
+            if total is not None:
+                self._shared = max(self._shared, total)
+            else:
+                # Count the lease locally so repeated failures still run into the limit
+                self._shared += request
+            self._leased += request - over
+            if self._used + tokens > self._leased:
+                return False
+            self._used += tokens
+            return True
+
+    def _backend_incr(self, index: int, amount: int) -> Optional[int]:
+        try:
+            return self.backend.incr(self.key, index, amount, self.window * 2)
+        except Exception as e:
+            self.backend_errors += 1
+            print(f"Token budget sync failed: {e}")
+            return None
+
+    def reserve(self, tokens: int) -> bool:
+        """Set aside tokens for a call, refilling the lease inline if needed"""
+        reserved = self.try_reserve(tokens)
+        return self.refill(tokens) if reserved is None else reserved
+
+    async def reserve_async(self, tokens: int) -> bool:
+        """reserve() for the event loop: a remote lease refill runs in the background pool"""
+        reserved = self.try_reserve(tokens)
+        if reserved is not None:
+            return reserved
+        if not self.backend.remote:
+            return self.refill(tokens)
+        return await asyncio.get_running_loop().run_in_executor(_sync_executor, self.refill, tokens)
+
+    def reconcile(self, reserved: int, actual: int):
+        """Replace a reservation with the tokens the call actually used"""
+        with self._lock:
+            self._roll(time.time())
+            self._used = max(0, self._used + actual - reserved)
+
+    def retry_after(self, tokens: int) -> float:
+        """Seconds until tokens should fit, assuming no other usage in the meantime"""
+        with self._lock:
+            now = time.time()
+            elapsed = self._roll(now)
+            local = max(0, self._leased - self._used)
+            deficit = self._previous * (1 - elapsed) + self._shared - local + tokens - self.limit
+            if deficit <= 0:
+                return 0.0
+            if deficit <= self._previous * (1 - elapsed):
+                # The previous window decays enough before this one ends
+                return deficit / self._previous * self.window
+            # Wait for this window to roll over and start decaying in turn
+            rest = (1 - elapsed) * self.window
+            if not self._shared:
+                return rest
+            return rest + max(0.0, 1 - (self.limit - tokens) / self._shared) * self.window
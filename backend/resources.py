@@ -1,23 +1,116 @@
-from pypdf import PdfReader
+"""
+Persona resources: LinkedIn profile text, summary, style notes and facts
+The default persona lives in ./data and any other persona in ./data/personas/{id}.
+Deployed packages load a snapshot pre-extracted at build time by deploy.py;
+without one (local dev) the source files are parsed directly.
+Attributes of the default persona are loaded lazily on first access.
+"""
+
+import hashlib
 import json
+import os
+
+DATA_DIR = "./data"
+PERSONAS_DIR = os.path.join(DATA_DIR, "personas")
+SNAPSHOT_FILE = "resources.snapshot.json"
+SNAPSHOT_VERSION = 1
+
+_resources: dict = {}
+_hash: str = ""
+
+
+def parse_sources(data_dir: str = DATA_DIR) -> dict:
+    """Extract every resource from the raw files in data_dir"""
+    # pypdf is only needed here, so it stays out of the runtime import graph
+    from pypdf import PdfReader
+
+    # Read LinkedIn PDF
+    try:
+        reader = PdfReader(os.path.join(data_dir, "linkedin.pdf"))
+        linkedin = ""
+        for page in reader.pages:
+            text = page.extract_text()
+            if text:
+                linkedin += text
+    except FileNotFoundError:
+        linkedin = "LinkedIn profile not available"
+
+    # Read other data files
+    with open(os.path.join(data_dir, "summary.txt"), "r", encoding="utf-8") as f:
+        summary = f.read()
+
+    with open(os.path.join(data_dir, "style.txt"), "r", encoding="utf-8") as f:
+        style = f.read()
+
+    with open(os.path.join(data_dir, "facts.json"), "r", encoding="utf-8") as f:
+        facts = json.load(f)
+
+    return {"linkedin": linkedin, "summary": summary, "style": style, "facts": facts}
+
+
+def compute_hash(resources: dict) -> str:
+    """Content hash of the extracted resources"""
+    canonical = json.dumps(resources, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_snapshot(data_dir: str, output_path: str) -> str:
+    """Pre-extract data_dir into a single compact snapshot file, returning its content hash"""
+    resources = parse_sources(data_dir)
+    content_hash = compute_hash(resources)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": SNAPSHOT_VERSION, "hash": content_hash, "resources": resources},
+            f,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+    return content_hash
+
+
+def load_bundle(data_dir: str) -> tuple[dict, str]:
+    """Return (resources, content hash) for one persona directory, preferring its snapshot"""
+    snapshot_path = os.path.join(data_dir, SNAPSHOT_FILE)
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if snapshot.get("version") == SNAPSHOT_VERSION:
+            return snapshot["resources"], snapshot["hash"]
+        print(f"Ignoring resource snapshot with unsupported version {snapshot.get('version')}")
+
+    if os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+        print(f"Resource snapshot missing in {data_dir}, parsing data files at cold start")
+    resources = parse_sources(data_dir)
+    return resources, compute_hash(resources)
+
+
+def persona_dirs() -> list[tuple[str, str]]:
+    """(persona id, directory) of every additional persona under PERSONAS_DIR"""
+    if not os.path.isdir(PERSONAS_DIR):
+        return []
+    return sorted(
+        (name, os.path.join(PERSONAS_DIR, name))
+        for name in os.listdir(PERSONAS_DIR)
+        if os.path.isfile(os.path.join(PERSONAS_DIR, name, "facts.json"))
+    )
+
+
+def load() -> dict:
+    """Load the default persona's resources once per process"""
+    global _resources, _hash
+    if not _resources:
+        _resources, _hash = load_bundle(DATA_DIR)
+    return _resources
+
+
+def content_hash() -> str:
+    """Content hash of the loaded resources"""
+    load()
+    return _hash
+
 
-# Read LinkedIn PDF
-try:
-    reader = PdfReader("./data/linkedin.pdf")
-    linkedin = ""
-    for page in reader.pages:
-        text = page.extract_text()
-        if text:
-            linkedin += text
-except FileNotFoundError:
-    linkedin = "LinkedIn profile not available"
-
-# Read other data files
-with open("./data/summary.txt", "r", encoding="utf-8") as f:
-    summary = f.read()
-
-with open("./data/style.txt", "r", encoding="utf-8") as f:
-    style = f.read()
-
-with open("./data/facts.json", "r", encoding="utf-8") as f:
-    facts = json.load(f)
\ No newline at end of file
+def __getattr__(name: str):
+    # Lazy module attributes: linkedin, summary, style, facts
+    if name in ("linkedin", "summary", "style", "facts"):
+        return load()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
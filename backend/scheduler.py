@@ -0,0 +1,172 @@
+"""
+Backpressure for Bedrock calls when the token budget is tight
+Each call reserves an estimated token count before it starts. When the budget
+can't cover it, the request waits in a bounded queue that is served round-robin
+across sessions (or client IPs), so one busy visitor can't starve the others.
+Load is shed only once the queue is full or a request has waited too long.
+"""
+
+import asyncio
+import os
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from ratelimit import TokenBudget
+
+# Requests allowed to wait for budget at once, per instance
+BUDGET_QUEUE_SIZE = int(os.environ.get("BUDGET_QUEUE_SIZE", "64"))
+# Seconds a request may wait for budget before it is turned away
+BUDGET_QUEUE_WAIT = float(os.environ.get("BUDGET_QUEUE_WAIT", "20"))
+
+# Bounds on how long the queue sleeps between budget checks
+_MIN_POLL = 0.05
+_MAX_POLL = 1.0
+
+
+class Overloaded(Exception):
+    """No budget for this request; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: float, queue_full: bool):
+        super().__init__("queue full" if queue_full else "timed out waiting for budget")
+        self.retry_after = retry_after
+        self.queue_full = queue_full
+
+
+class _Waiter:
+    __slots__ = ("key", "tokens", "future")
+
+    def __init__(self, key: str, tokens: int, future: asyncio.Future):
+        self.key = key
+        self.tokens = tokens
+        self.future = future
+
+
+class Reservation:
+    """Tokens granted by a scheduler, settled exactly once by whichever path finishes first"""
+
+    __slots__ = ("scheduler", "tokens", "settled")
+
+    def __init__(self, scheduler: "TokenScheduler", tokens: int):
+        self.scheduler = scheduler
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, actual: int):
+        if not self.settled:
+            self.settled = True
+            self.scheduler.reconcile(self.tokens, actual)
+
+
+class TokenScheduler:
+    def __init__(self, budget: TokenBudget, max_waiters: int = BUDGET_QUEUE_SIZE, max_wait: float = BUDGET_QUEUE_WAIT):
+        self.budget = budget
+        self.max_waiters = max_waiters
+        self.max_wait = max_wait
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._waiting = 0
+        self._pump_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timeouts = 0
+
+    async def acquire(self, key: str, tokens: int):
+        """Reserve tokens, queueing behind other keys while the budget is short"""
+        # Skip the queue only when nobody is waiting, so queued requests keep their turn
+        if not self._waiting and await self._reserve(tokens):
+            self.admitted += 1
+            return
+        if self._waiting >= self.max_waiters:
+            self.shed += 1
+            raise Overloaded(self.budget.retry_after(tokens), queue_full=True)
+
+        waiter = _Waiter(key, tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(key, deque()).append(waiter)
+        self._waiting += 1
+        self.queued += 1
+        if self._pump_task is None:
+            self._pump_task = asyncio.create_task(self._pump())
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except TimeoutError:
+            self.timeouts += 1
+            raise Overloaded(self.budget.retry_after(tokens), queue_full=False)
+        except asyncio.CancelledError:
+            # The caller went away after its turn came: hand the reservation back
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.reconcile(tokens, 0)
+            raise
+        finally:
+            if not waiter.future.done() or waiter.future.cancelled():
+                self._discard(waiter)
+        self.admitted += 1
+
+    async def _reserve(self, tokens: int) -> bool:
+        """Reserve from the budget; tokens reserved after the caller went away are handed back"""
+        task = asyncio.ensure_future(self.budget.reserve_async(tokens))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            def settle(done: asyncio.Future):
+                if not done.cancelled() and done.exception() is None and done.result():
+                    self.reconcile(tokens, 0)
+
+            task.add_done_callback(settle)
+            raise
+
+    def reconcile(self, reserved: int, actual: int):
+        """Settle a reservation; tokens handed back wake the queue"""
+        self.budget.reconcile(reserved, actual)
+        if actual < reserved:
+            self._wake.set()
+
+    def _discard(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.key)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._waiting -= 1
+            if not queue:
+                del self._queues[waiter.key]
+
+    async def _pump(self):
+        try:
+            while self._queues:
+                key, queue = next(iter(self._queues.items()))
+                waiter = queue[0]
+                if waiter.future.done():
+                    self._discard(waiter)
+                    continue
+                reserved = await self._reserve(waiter.tokens)
+                if waiter.future.done():
+                    # Timed out or cancelled while the lease was refilled
+                    if reserved:
+                        self.reconcile(waiter.tokens, 0)
+                    self._discard(waiter)
+                    continue
+                if not reserved:
+                    delay = min(max(self.budget.retry_after(waiter.tokens), _MIN_POLL), _MAX_POLL)
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), delay)
+                    except TimeoutError:
+                        pass
+                    continue
+                queue.popleft()
+                self._waiting -= 1
+                # Round robin: this key goes to the back of the line
+                del self._queues[key]
+                if queue:
+                    self._queues[key] = queue
+                waiter.future.set_result(None)
+        finally:
+            self._pump_task = None
+
+    def stats(self) -> Dict:
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "waiting": self._waiting,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+        }
@@ -5,7 +5,7 @@ Zero external dependencies - uses only Python standard library
 
 import re
 import logging
-from typing import Tuple
+from typing import Optional, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,43 +14,53 @@ logger = logging.getLogger("security")
 # Maximum message length (characters)
 MAX_MESSAGE_LENGTH = 2000
 
-# Patterns that indicate potential prompt injection attempts
-INJECTION_PATTERNS = [
+# Rules that indicate potential prompt injection attempts, as (name, keywords, pattern).
+# A rule's pattern only runs when one of its keywords occurs in the lowercased message.
+INJECTION_RULES = [
     # Direct instruction override attempts
-    r"ignore\s+(all\s+)?(previous|prior|above|earlier)\s+(instructions?|prompts?|rules?|context)",
-    r"disregard\s+(all\s+)?(previous|prior|above|earlier)\s+(instructions?|prompts?|rules?)",
-    r"forget\s+(all\s+)?(previous|prior|above|earlier)\s+(instructions?|prompts?|rules?)",
-    r"override\s+(all\s+)?(previous|prior|system)\s+(instructions?|prompts?|rules?)",
+    ("ignore_previous", ("ignore",), r"ignore\s+(all\s+)?(previous|prior|above|earlier)\s+(instructions?|prompts?|rules?|context)"),
+    ("disregard_previous", ("disregard",), r"disregard\s+(all\s+)?(previous|prior|above|earlier)\s+(instructions?|prompts?|rules?)"),
+    ("forget_previous", ("forget",), r"forget\s+(all\s+)?(previous|prior|above|earlier)\s+(instructions?|prompts?|rules?)"),
+    ("override_previous", ("override",), r"override\s+(all\s+)?(previous|prior|system)\s+(instructions?|prompts?|rules?)"),
 
     # System prompt extraction attempts
-    r"(show|tell|reveal|display|print|output|repeat)\s+(me\s+)?(your|the)\s+(system\s+)?(prompt|instructions?|rules?|context)",
-    r"what\s+(are|is)\s+(your|the)\s+(system\s+)?(prompt|instructions?|rules?)",
+    ("reveal_prompt", ("prompt", "instruction", "rule", "context"), r"(show|tell|reveal|display|print|output|repeat)\s+(me\s+)?(your|the)\s+(system\s+)?(prompt|instructions?|rules?|context)"),
+    ("ask_prompt", ("prompt", "instruction", "rule"), r"what\s+(are|is)\s+(your|the)\s+(system\s+)?(prompt|instructions?|rules?)"),
 
     # Role switching attempts
-    r"you\s+are\s+now\s+(a|an|the)",
-    r"pretend\s+(to\s+be|you\s+are)",
-    r"act\s+as\s+(if\s+you\s+are|a|an)",
-    r"roleplay\s+as",
-    r"from\s+now\s+on\s+(you\s+are|you're|act\s+as)",
+    ("you_are_now", ("now",), r"you\s+are\s+now\s+(a|an|the)"),
+    ("pretend", ("pretend",), r"pretend\s+(to\s+be|you\s+are)"),
+    ("act_as", ("act",), r"act\s+as\s+(if\s+you\s+are|a|an)"),
+    ("roleplay", ("roleplay",), r"roleplay\s+as"),
+    ("from_now_on", ("now",), r"from\s+now\s+on\s+(you\s+are|you're|act\s+as)"),
 
     # Developer/debug mode attempts
-    r"(enter|enable|activate|switch\s+to)\s+(developer|debug|admin|sudo|root)\s+mode",
-    r"dev\s*mode\s*(on|enabled?|activate)",
+    ("enter_mode", ("mode",), r"(enter|enable|activate|switch\s+to)\s+(developer|debug|admin|sudo|root)\s+mode"),
+    ("dev_mode", ("mode",), r"dev\s*mode\s*(on|enabled?|activate)"),
 
-    # Jailbreak keywords
-    r"\bdan\b.*\bjailbreak",
-    r"do\s+anything\s+now",
-    r"\bdeveloper\s+mode\b",
+    # Jailbreak keywords ("dan" followed later by "jailbreak" is checked separately)
+    ("do_anything_now", ("anything",), r"do\s+anything\s+now"),
+    ("developer_mode", ("mode",), r"\bdeveloper\s+mode\b"),
 
     # Instruction injection markers
-    r"\[system\]",
-    r"\[instruction\]",
-    r"<\s*system\s*>",
-    r"###\s*(instruction|system|prompt)",
+    ("system_tag", ("[system]",), r"\[system\]"),
+    ("instruction_tag", ("[instruction]",), r"\[instruction\]"),
+    ("system_element", ("<",), r"<\s*system\s*>"),
+    ("markdown_heading", ("###",), r"###\s*(instruction|system|prompt)"),
 ]
 
+# Original pattern list, kept for reference and benchmarking
+INJECTION_PATTERNS = [pattern for _, _, pattern in INJECTION_RULES] + [r"\bdan\b.*\bjailbreak"]
+
 # Compile patterns for performance
-COMPILED_PATTERNS = [re.compile(p, re.IGNORECASE) for p in INJECTION_PATTERNS]
+COMPILED_RULES = [(name, keywords, re.compile(pattern)) for name, keywords, pattern in INJECTION_RULES]
+
+# Every keyword, checked once per message as a substring
+INJECTION_KEYWORDS = sorted({keyword for _, keywords, _ in INJECTION_RULES for keyword in keywords} | {"dan", "jailbreak"})
+
+# "dan" then "jailbreak" is two forward searches instead of a backtracking ".*"
+_DAN = re.compile(r"\bdan\b")
+_JAILBREAK = re.compile(r"\bjailbreak")
 
 
 def check_message_length(message: str) -> Tuple[bool, str]:
@@ -60,14 +70,35 @@ def check_message_length(message: str) -> Tuple[bool, str]:
     return True, ""
 
 
-def detect_injection_patterns(message: str) -> Tuple[bool, str]:
-    """Detect potential prompt injection patterns."""
+def find_injection(message: str) -> Optional[str]:
+    """
+    Return the name of the first injection rule that matches, or None.
+    One pass per keyword gates the rule patterns; none of the patterns contains
+    an unbounded wildcard, so the total work is linear in message length.
+    """
     message_lower = message.lower()
+    present = {keyword for keyword in INJECTION_KEYWORDS if keyword in message_lower}
+    if not present:
+        return None
 
-    for pattern in COMPILED_PATTERNS:
-        if pattern.search(message_lower):
-            logger.warning(f"Potential injection detected: pattern matched")
-            return False, "I can only answer questions about Raoul's professional experience and skills."
+    for name, keywords, pattern in COMPILED_RULES:
+        if not present.isdisjoint(keywords) and pattern.search(message_lower):
+            return name
+
+    if "dan" in present and "jailbreak" in present:
+        dan = _DAN.search(message_lower)
+        if dan and _JAILBREAK.search(message_lower, dan.end()):
+            return "dan_jailbreak"
+
+    return None
+
+
+def detect_injection_patterns(message: str) -> Tuple[bool, str]:
+    """Detect potential prompt injection patterns."""
+    rule = find_injection(message)
+    if rule is not None:
+        logger.warning(f"Potential injection detected: rule {rule} matched")
+        return False, "I can only answer questions about Raoul's professional experience and skills."
 
     return True, ""
 
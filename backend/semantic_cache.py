@@ -0,0 +1,222 @@
+"""
+Semantic near-duplicate lookup for first-turn questions
+Sits behind the exact-match response cache and catches paraphrases such as
+"where did you study?" and "what is your education?". Questions are embedded
+locally as hashed character n-gram TF-IDF vectors; no model or network call.
+Replies are only reused for a question in the same language as the one they answered.
+
+NumPy is optional: without it (or with SEMANTIC_CACHE unset) the layer is disabled,
+with a warning at import when SEMANTIC_CACHE asks for it.
+"""
+
+import math
+import os
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+from response_cache import RESPONSE_CACHE_TTL, normalize_question
+
+SEMANTIC_CACHE = os.environ.get("SEMANTIC_CACHE", "false").lower() == "true"
+# Minimum cosine similarity for a stored reply to be reused
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.75"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1024"))
+
+if SEMANTIC_CACHE and np is None:
+    print("SEMANTIC_CACHE is set but numpy is not installed; the semantic cache is disabled")
+
+EMBEDDING_DIM = 2048
+NGRAM_SIZES = (3, 4, 5)
+
+# Function words carry no meaning for matching, but tell the two languages apart
+EN_WORDS = frozenset("""
+a about an and are as at be can could did do does for from have hold how i in is it me
+of on or please tell the to was we were what when where which who why with would you
+your yours
+""".split())
+FR_WORDS = frozenset("""
+a au aux avec c ce ces comment d dans de des du elle en est et etait fais faire fait il j
+je l la le les leur m ma mais me mes moi mon n ne nous on ou par pas peux peut pour puis
+quel quelle quelles quels qu que qui s sa se ses son sont sur t ta te tes toi ton tu un
+une vos votre vous as avez es etes ete y
+""".split())
+STOP_WORDS = EN_WORDS | FR_WORDS
+_ACCENTED = frozenset("àâçéèêëîïôùûü")
+
+# Domain vocabulary folded onto one concept per topic, so EN/FR and synonyms share features
+CONCEPTS = {
+    "education": "study studied studies studying school university universite degree degrees diploma"
+                 " diplome diplomes education educated etudes etudie etudier formation ecole bachelor"
+                 " baccalaureat master maitrise college",
+    "work": "work worked working job jobs career employer employers position role roles travail"
+            " travaille travailles emploi emplois carriere poste employeur experience experiences"
+            " professional professionnelle professionnel",
+    "skills": "skill skills competence competences expertise strengths forces abilities habiletes",
+    "certification": "certification certifications certified certifie certificate"
+                     " certificat cissp cism cisa",
+    "language": "language languages langue langues speak parles parlez bilingual bilingue",
+    "contact": "contact reach email courriel joindre linkedin",
+    "hobbies": "hobby hobbies interests interets loisirs passions passion free time temps libre libres",
+    "current": "current currently now today actuel actuelle actuellement presentement present",
+    "location": "live lives located location based habites habitez ville city country pays",
+    "security": "security cybersecurity cybersecurite securite infosec",
+}
+_CONCEPT_OF = {word: concept for concept, words in CONCEPTS.items() for word in words.split()}
+
+
+def detect_language(question: str) -> str:
+    """"en", "fr", or "" when the function words and accents don't settle it"""
+    words = normalize_question(question).split()
+    english = sum(w in EN_WORDS and w not in FR_WORDS for w in words)
+    french = sum(w in FR_WORDS and w not in EN_WORDS for w in words)
+    french += sum(c in _ACCENTED for c in question.lower())
+    if english == french:
+        return ""
+    return "en" if english > french else "fr"
+
+
+def _terms(question: str) -> List[str]:
+    words = normalize_question(question).split()
+    return [_CONCEPT_OF.get(w, w) for w in words if w not in STOP_WORDS]
+
+
+def _features(question: str) -> List[int]:
+    """Hashed feature indices: whole terms plus character n-grams of each padded term"""
+    features = []
+    for term in _terms(question):
+        features.append(zlib.crc32(term.encode("utf-8")) % EMBEDDING_DIM)
+        padded = f"<{term}>"
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                features.append(zlib.crc32(padded[i:i + n].encode("utf-8")) % EMBEDDING_DIM)
+    return features
+
+
+def embed(question: str) -> "np.ndarray":
+    """Sublinear term-frequency vector; IDF weighting is applied at search time"""
+    counts: Dict[int, int] = {}
+    for index in _features(question):
+        counts[index] = counts.get(index, 0) + 1
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for index, count in counts.items():
+        vector[index] = 1.0 + math.log(count)
+    return vector
+
+
+def available() -> bool:
+    return SEMANTIC_CACHE and np is not None
+
+
+class SemanticCache:
+    """
+    Stored questions live in one contiguous float32 matrix so a lookup is a
+    single matrix-vector product. Document frequencies are kept per dimension
+    and weighted row norms are refreshed lazily, on the first lookup after an insert.
+    Each row records the prompt/resources version it was answered under and the
+    language of its question, and lookups skip rows that differ in either. Personas
+    share the capacity without emptying each other's entries; rows of a version no
+    longer asked for age out as the least recently used.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: int = RESPONSE_CACHE_TTL,
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._matrix = np.zeros((min(self.max_entries, 64), EMBEDDING_DIM), dtype=np.float32)
+        self._df = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        self._idf_sq = np.ones(EMBEDDING_DIM, dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._expires = np.zeros(0, dtype=np.float64)
+        self._last_used = np.zeros(0, dtype=np.float64)
+        self._languages = np.zeros(0, dtype="<U2")
+        self._versions = np.zeros(0, dtype=object)
+        self._responses: List[str] = []
+        self._stale = False
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def _reweight(self):
+        n = len(self._responses)
+        idf = np.log((1.0 + n) / (1.0 + self._df)) + 1.0
+        self._idf_sq = (idf * idf).astype(np.float32)
+        rows = self._matrix[:n]
+        self._norms = np.sqrt(np.einsum("ij,ij,j->i", rows, rows, self._idf_sq))
+        self._stale = False
+
+    def lookup(self, question: str, version: str) -> Optional[str]:
+        """Reply stored for the most similar question above the threshold, if any"""
+        query = embed(question)
+        language = detect_language(question)
+        with self._lock:
+            n = len(self._responses)
+            if not n or not query.any():
+                self.misses += 1
+                return None
+            if self._stale:
+                self._reweight()
+            weighted = query * self._idf_sq
+            query_norm = math.sqrt(float(query @ weighted))
+            scores = (self._matrix[:n] @ weighted) / (self._norms * query_norm + 1e-9)
+            scores[self._expires < time.monotonic()] = -1.0
+            scores[(self._languages != language) | (self._versions != version)] = -1.0
+            best = int(scores.argmax())
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = time.monotonic()
+            self.hits += 1
+            return self._responses[best]
+
+    def put(self, question: str, response: str, version: str):
+        if not self.max_entries:
+            return
+        vector = embed(question)
+        if not vector.any():
+            return
+        language = detect_language(question)
+        now = time.monotonic()
+        with self._lock:
+            n = len(self._responses)
+            if n < self.max_entries:
+                if n == len(self._matrix):
+                    grown = np.zeros((min(self.max_entries, n * 2), EMBEDDING_DIM), dtype=np.float32)
+                    grown[:n] = self._matrix
+                    self._matrix = grown
+                slot = n
+                self._responses.append(response)
+                self._expires = np.append(self._expires, 0.0)
+                self._last_used = np.append(self._last_used, 0.0)
+                self._languages = np.append(self._languages, language)
+                self._versions = np.append(self._versions, None)
+            else:
+                # Replace an expired entry, otherwise the least recently used one
+                expired = np.flatnonzero(self._expires < now)
+                slot = int(expired[0]) if expired.size else int(self._last_used.argmin())
+                self._df -= self._matrix[slot] > 0
+                self._responses[slot] = response
+            self._matrix[slot] = vector
+            self._df += vector > 0
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._languages[slot] = language
+            self._versions[slot] = version
+            self._stale = True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._responses)}
@@ -1,21 +1,40 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request, Response
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 import os
-from dotenv import load_dotenv
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, AsyncGenerator, AsyncIterator
 import json
 import uuid
+import hashlib
+import math
+import asyncio
 from datetime import datetime
-from collections import defaultdict
+import threading
 import time
-import boto3
+import re
 from botocore.exceptions import ClientError
-from context import prompt
+from context_window import build_messages, estimate_tokens, message_tokens, select_history
 from security import validate_message
-
-# Load environment variables
-load_dotenv()
+from storage import ConflictError, LocalStore, NotModified, S3Store, window
+from session_cache import SessionCache
+from response_cache import ResponseCache, make_key
+from semantic_cache import SemanticCache, available as semantic_cache_available
+from singleflight import SingleFlight
+from personas import DEFAULT_PERSONA, Persona, PersonaCache, UnknownPersona
+from ratelimit import RateLimiter, TokenBudget, create_backend
+from scheduler import Overloaded, Reservation, TokenScheduler
+from io_pool import BEDROCK_CONCURRENCY, S3_CONCURRENCY, client_config, run_bedrock, run_s3
+from metrics import TOKEN_BUCKETS, registry, stage
+
+# Load environment variables (Lambda gets its configuration from the function environment)
+if not os.environ.get("AWS_LAMBDA_FUNCTION_NAME"):
+    from dotenv import load_dotenv
+
+    load_dotenv()
 
 app = FastAPI()
 
@@ -35,28 +54,89 @@ APP_API_KEY = os.environ.get("APP_API_KEY", "")
 # Rate limiting: track requests per IP
 RATE_LIMIT_MAX = int(os.environ["RATE_LIMIT_MAX"])
 RATE_LIMIT_WINDOW = int(os.environ["RATE_LIMIT_WINDOW"])
-rate_limit_store: dict[str, list[float]] = defaultdict(list)
 
-# Token budget: max tokens per minute across all users
+# Token budget: max tokens per rolling minute across all users
 TOKEN_BUDGET_PER_MINUTE = 15_000
-_token_store: dict = {"minute": "", "used": 0}
 
-def _current_minute() -> str:
-    return time.strftime("%Y-%m-%dT%H:%M")
+# Per-persona overrides, e.g. {"alice": {"rate_limit_max": 10, "token_budget_per_minute": 5000}}
+PERSONA_LIMITS: Dict[str, Dict] = json.loads(os.environ.get("PERSONA_LIMITS", "{}"))
+
+# Counters are shared across instances through the configured limiter backend
+limiter_backend = create_backend()
+# Chat requests are limited per persona (see _persona_limits); this covers the other routes
+rate_limiter = RateLimiter(limiter_backend, RATE_LIMIT_MAX, RATE_LIMIT_WINDOW)
+token_budget = TokenBudget(limiter_backend, TOKEN_BUDGET_PER_MINUTE)
+# Requests wait here for budget instead of being turned away outright
+token_scheduler = TokenScheduler(token_budget)
+
+# Chat routes resolve the persona first and apply that persona's rate limit
+_CHAT_ROUTES = ("/chat", "/chat/stream")
+
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+class _PersonaLimits:
+    """A persona's rate limiter and token budget queue (kept for the process, unlike bundles)"""
+
+    __slots__ = ("rate_limiter", "scheduler", "key_prefix")
+
+    def __init__(self, rate_limiter: RateLimiter, scheduler: TokenScheduler, key_prefix: str):
+        self.rate_limiter = rate_limiter
+        self.scheduler = scheduler
+        self.key_prefix = key_prefix
 
-def _within_token_budget() -> bool:
-    minute = _current_minute()
-    if _token_store["minute"] != minute:
-        _token_store["minute"] = minute
-        _token_store["used"] = 0
-    return _token_store["used"] < TOKEN_BUDGET_PER_MINUTE
 
-def _record_tokens(tokens: int):
-    minute = _current_minute()
-    if _token_store["minute"] != minute:
-        _token_store["minute"] = minute
-        _token_store["used"] = 0
-    _token_store["used"] += tokens
+# The default persona keeps the original counters and keys
+_persona_limits: Dict[str, _PersonaLimits] = {
+    DEFAULT_PERSONA: _PersonaLimits(rate_limiter, token_scheduler, ""),
+}
+_persona_limits_lock = threading.Lock()
+
+
+def _limits_for(persona_id: str) -> _PersonaLimits:
+    limits = _persona_limits.get(persona_id)
+    if limits is None:
+        with _persona_limits_lock:
+            limits = _persona_limits.get(persona_id)
+            if limits is None:
+                overrides = PERSONA_LIMITS.get(persona_id, {})
+                limits = _persona_limits[persona_id] = _PersonaLimits(
+                    RateLimiter(limiter_backend, overrides.get("rate_limit_max", RATE_LIMIT_MAX), RATE_LIMIT_WINDOW),
+                    TokenScheduler(TokenBudget(
+                        limiter_backend,
+                        overrides.get("token_budget_per_minute", TOKEN_BUDGET_PER_MINUTE),
+                        key=f"tokens:{persona_id}",
+                    )),
+                    f"{persona_id}:",
+                )
+    return limits
+
+
+RATE_LIMITED_MESSAGE = "Too many requests. Please try again later."
+
+rate_limited = registry.counter("twin_rate_limited_total", "Requests rejected by the per-IP rate limit")
+tokens_per_request = registry.histogram(
+    "twin_tokens_per_request", "Tokens charged per Bedrock call", TOKEN_BUCKETS, unit="Count"
+)
+_request_seconds: Dict[str, object] = {}
+
+
+def _route(path: str) -> str:
+    """Route label for request metrics, keeping session ids out of the label values"""
+    if path.startswith("/conversation/"):
+        return "/conversation"
+    return path if path in ("/chat", "/chat/stream", "/metrics") else "other"
+
+
+def _request_histogram(route: str):
+    histogram = _request_seconds.get(route)
+    if histogram is None:
+        histogram = _request_seconds[route] = registry.histogram(
+            "twin_request_seconds", "Request latency until the response starts", route=route
+        )
+    return histogram
 
 
 @app.middleware("http")
@@ -67,47 +147,99 @@ async def security_middleware(request: Request, call_next):
     if request.url.path in ["/", "/health"] or request.method == "OPTIONS":
         return await call_next(request)
 
-    # API Key check
-    if APP_API_KEY:
-        provided_key = request.headers.get("X-API-Key", "")
-        if provided_key != APP_API_KEY:
-            return JSONResponse(status_code=403, content={"detail": "Invalid API key"})
+    start = time.perf_counter()
+    with stage("security"):
+        # API Key check
+        if APP_API_KEY:
+            provided_key = request.headers.get("X-API-Key", "")
+            if provided_key != APP_API_KEY:
+                return JSONResponse(status_code=403, content={"detail": "Invalid API key"})
 
-    # Rate limiting by IP
-    client_ip = request.client.host if request.client else "unknown"
-    now = time.time()
-    # Clean old entries outside the window
-    rate_limit_store[client_ip] = [t for t in rate_limit_store[client_ip] if now - t < RATE_LIMIT_WINDOW]
-    if len(rate_limit_store[client_ip]) >= RATE_LIMIT_MAX:
-        return JSONResponse(status_code=429, content={"detail": "Too many requests. Please try again later."})
-    rate_limit_store[client_ip].append(now)
+        # Rate limiting by IP
+        if request.url.path not in _CHAT_ROUTES and not rate_limiter.allow(_client_ip(request)):
+            rate_limited.inc()
+            return JSONResponse(status_code=429, content={"detail": RATE_LIMITED_MESSAGE})
 
-    return await call_next(request)
+    response = await call_next(request)
+    _request_histogram(_route(request.url.path)).observe(time.perf_counter() - start)
+    registry.maybe_emit()
+    return response
 
 
-# Initialize Bedrock client
-bedrock_client = boto3.client(
-    service_name="bedrock-runtime",
-    region_name=os.environ["DEFAULT_AWS_REGION"]
-)
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    # Chat routes are limited after the persona is resolved, which a malformed body never
+    # reaches, so count it against the default limit here
+    if request.url.path in _CHAT_ROUTES and not rate_limiter.allow(_client_ip(request)):
+        from fastapi.responses import JSONResponse
+
+        rate_limited.inc()
+        return JSONResponse(status_code=429, content={"detail": RATE_LIMITED_MESSAGE})
+    return await request_validation_exception_handler(request, exc)
+
+
+# AWS clients are created on first use so cold starts and health pings skip boto3
+bedrock_client = None
+s3_client = None
+_client_lock = threading.Lock()
+
+
+def get_bedrock_client():
+    """Return the Bedrock runtime client, creating it on first use"""
+    global bedrock_client
+    if bedrock_client is None:
+        with _client_lock:
+            if bedrock_client is None:
+                import boto3
+
+                bedrock_client = boto3.client(
+                    service_name="bedrock-runtime",
+                    region_name=os.environ["DEFAULT_AWS_REGION"],
+                    config=client_config(BEDROCK_CONCURRENCY),
+                )
+    return bedrock_client
+
+
+def get_s3_client():
+    """Return the S3 client, creating it on first use"""
+    global s3_client
+    if s3_client is None:
+        with _client_lock:
+            if s3_client is None:
+                import boto3
+
+                s3_client = boto3.client("s3", config=client_config(S3_CONCURRENCY))
+    return s3_client
+
 
 # Bedrock model selection
 BEDROCK_MODEL_ID = os.environ["BEDROCK_MODEL_ID"]
 
+# Mark the static system prompt for Bedrock prompt caching (disable for models without support)
+BEDROCK_PROMPT_CACHE = os.environ.get("BEDROCK_PROMPT_CACHE", "true").lower() == "true"
+
+# Cache reads are billed at a fraction of regular input tokens
+CACHE_READ_TOKEN_WEIGHT = 0.1
+
 # Memory storage configuration
 USE_S3 = os.environ["USE_S3"].lower() == "true"
 S3_BUCKET = os.environ["S3_BUCKET"]
 MEMORY_DIR = os.environ["MEMORY_DIR"]
 
-# Initialize S3 client if needed
-if USE_S3:
-    s3_client = boto3.client("s3")
+# Most recent stored messages loaded per turn; context_window trims them to its token budget
+HISTORY_TAIL = 20
+
+# Page size of GET /conversation when the request names none, and the largest it serves
+CONVERSATION_PAGE_SIZE = int(os.environ.get("CONVERSATION_PAGE_SIZE", "50"))
+CONVERSATION_PAGE_MAX = int(os.environ.get("CONVERSATION_PAGE_MAX", "200"))
 
 
 # Request/Response models
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
+    # Twin to talk to; the deployment's default persona when omitted
+    persona_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -122,75 +254,256 @@ class Message(BaseModel):
 
 
 # Memory management functions
-def get_memory_path(session_id: str) -> str:
-    return f"{session_id}.json"
+conversation_store = S3Store(S3_BUCKET, get_s3_client) if USE_S3 else LocalStore(MEMORY_DIR)
 
 
-def load_conversation(session_id: str) -> List[Dict]:
-    """Load conversation history from storage"""
-    if USE_S3:
-        try:
-            response = s3_client.get_object(Bucket=S3_BUCKET, Key=get_memory_path(session_id))
-            return json.loads(response["Body"].read().decode("utf-8"))
-        except ClientError as e:
-            if e.response["Error"]["Code"] == "NoSuchKey":
-                return []
-            raise
-    else:
-        # Local file storage
-        file_path = os.path.join(MEMORY_DIR, get_memory_path(session_id))
-        if os.path.exists(file_path):
-            with open(file_path, "r") as f:
-                return json.load(f)
-        return []
-
-
-def save_conversation(session_id: str, messages: List[Dict]):
-    """Save conversation history to storage"""
-    if USE_S3:
-        s3_client.put_object(
-            Bucket=S3_BUCKET,
-            Key=get_memory_path(session_id),
-            Body=json.dumps(messages, indent=2),
-            ContentType="application/json",
+def load_conversation(session_id: str, tail: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """Load conversation history from storage, returning (messages, total stored message count)"""
+    with stage("load"):
+        return conversation_store.load(session_id, tail)
+
+
+def load_conversation_range(
+    session_id: str, start: int, end: Optional[int], tail: Optional[int], known_count: Optional[int]
+) -> Tuple[List[Dict], int]:
+    """Load a range of the stored messages; raises NotModified if the session holds known_count"""
+    with stage("load"):
+        return conversation_store.load_range(session_id, start, end, tail, known_count)
+
+
+def save_conversation(session_id: str, new_messages: List[Dict], start: int):
+    """Append a turn's messages after the `start` messages already stored"""
+    with stage("save"):
+        conversation_store.append(session_id, new_messages, start)
+
+
+# Recent history of sessions served by this instance; turns are written behind the response
+session_cache = SessionCache()
+_flush_locks: Dict[str, list] = {}
+
+
+# Resource bundles and rendered prompts of the personas served by this instance
+persona_cache = PersonaCache()
+
+
+async def _resolve_persona(persona_id: Optional[str], http_request: Request) -> Persona:
+    """The persona a chat request is for; 404 for an unknown one"""
+    try:
+        persona = persona_cache.cached(persona_id or DEFAULT_PERSONA)
+        if persona is None:
+            # First request for this persona on the instance: read its bundle off the loop
+            persona = await asyncio.get_running_loop().run_in_executor(
+                None, persona_cache.load, persona_id or DEFAULT_PERSONA
+            )
+        return persona
+    except UnknownPersona:
+        # Counted against the default limit, so probing persona ids isn't free
+        _check_rate_limit(DEFAULT_PERSONA, http_request)
+        raise HTTPException(status_code=404, detail="Unknown persona")
+
+
+def _check_rate_limit(persona_id: str, http_request: Request):
+    """Per-IP request limit of the persona being chatted with"""
+    limits = _limits_for(persona_id)
+    if not limits.rate_limiter.allow(limits.key_prefix + _client_ip(http_request)):
+        rate_limited.inc()
+        raise HTTPException(status_code=429, detail=RATE_LIMITED_MESSAGE)
+
+
+# Replies to first-turn questions, shared by every visitor of this instance
+response_cache = ResponseCache()
+# Optional near-duplicate layer behind the exact match (needs numpy and SEMANTIC_CACHE=true)
+semantic_reply_cache = SemanticCache() if semantic_cache_available() else None
+
+
+def _reply_version(persona: Persona) -> str:
+    """Everything besides the question that shapes a first-turn reply"""
+    return f"{BEDROCK_MODEL_ID}:{persona.prompt_hash}:{persona.content_hash}"
+
+
+def _response_cache_key(persona: Persona, message: str, stored: int) -> Optional[str]:
+    """Cache key for context-free (first-turn) questions, None otherwise"""
+    if stored:
+        return None
+    return make_key(message, _reply_version(persona))
+
+
+def _cached_reply(persona: Persona, message: str, cache_key: Optional[str]) -> Optional[str]:
+    """Exact-match reply first, then the closest paraphrase from the semantic cache"""
+    if not cache_key:
+        return None
+    reply = response_cache.get(cache_key)
+    if reply is None and semantic_reply_cache is not None:
+        reply = semantic_reply_cache.lookup(message, _reply_version(persona))
+    return reply
+
+
+def _remember_reply(persona: Persona, message: str, cache_key: Optional[str], reply: str, stop_reason: Optional[str]):
+    # Only complete replies: an empty one, or one cut off by a guardrail or maxTokens,
+    # would be served to every later visitor asking the same question
+    if not cache_key or not reply.strip() or stop_reason != "end_turn":
+        return
+    response_cache.put(cache_key, reply)
+    if semantic_reply_cache is not None:
+        semantic_reply_cache.put(message, reply, _reply_version(persona))
+
+
+# Concurrent requests with an identical prompt share one Bedrock call
+bedrock_flights = SingleFlight()
+
+
+def _prompt_key(persona: Persona, conversation: List[Dict], user_message: str) -> str:
+    """Identity of the effective prompt (the timestamp in the system prompt is ignored)"""
+    material = json.dumps(
+        [_reply_version(persona), build_messages(conversation, user_message)],
+        ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+async def _load_recent(session_id: str) -> Tuple[List[Dict], int]:
+    """Recent history from the session cache, falling back to storage"""
+    cached = session_cache.get(session_id)
+    if cached is not None:
+        return cached
+    conversation, stored = await run_s3(load_conversation, session_id, HISTORY_TAIL)
+    session_cache.put(session_id, conversation, stored)
+    return conversation, stored
+
+
+async def _save_turn(session_id: str, conversation: List[Dict], stored: int, turn: List[Dict]):
+    """Cache the updated history, then persist the turn"""
+    session_cache.put(session_id, (conversation + turn)[-HISTORY_TAIL:], stored + len(turn))
+    await _flush_turn(session_id, turn, stored)
+
+
+# Flushes started by streams; held here so a closed stream's flush isn't garbage collected
+_stream_flushes: set = set()
+
+
+def _save_turn_behind(session_id: str, conversation: List[Dict], stored: int, turn: List[Dict]) -> asyncio.Task:
+    """Cache the updated history now and persist the turn in a task that outlives the caller"""
+    session_cache.put(session_id, (conversation + turn)[-HISTORY_TAIL:], stored + len(turn))
+    task = asyncio.create_task(_flush_turn(session_id, turn, stored))
+    _stream_flushes.add(task)
+    task.add_done_callback(_stream_flushes.discard)
+    return task
+
+
+async def _flush_turn(session_id: str, turn: List[Dict], stored: int):
+    # Flushes for one session run in order; [lock, number of flushes using it]
+    entry = _flush_locks.setdefault(session_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            try:
+                await run_s3(save_conversation, session_id, turn, stored)
+            except ConflictError:
+                # Another instance appended to this session, so the cached copy is stale:
+                # drop it and append after the newer messages instead of overwriting them
+                session_cache.invalidate(session_id)
+                _, latest = await run_s3(load_conversation, session_id, 1)
+                await run_s3(save_conversation, session_id, turn, latest)
+    except Exception as e:
+        session_cache.invalidate(session_id)
+        print(f"Error saving conversation {session_id}: {str(e)}")
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _flush_locks[session_id]
+
+
+async def _wait_for_flush(session_id: str):
+    """Wait until pending writes for a session have reached storage"""
+    entry = _flush_locks.get(session_id)
+    if entry is not None:
+        async with entry[0]:
+            pass
+
+
+INFERENCE_CONFIG = {
+    "maxTokens": 2000,
+    "temperature": 0.3,
+    "topP": 0.9
+}
+
+
+def _usage_tokens(usage: Dict) -> int:
+    """Tokens charged to the budget, counting prompt-cache reads at their discounted weight"""
+    if "cacheReadInputTokens" not in usage and "cacheWriteInputTokens" not in usage:
+        return usage.get("totalTokens", 0)
+    return (
+        usage.get("inputTokens", 0)
+        + usage.get("outputTokens", 0)
+        + usage.get("cacheWriteInputTokens", 0)
+        + int(usage.get("cacheReadInputTokens", 0) * CACHE_READ_TOKEN_WEIGHT)
+    )
+
+
+# Tokens set aside for the reply until the call reports its actual usage
+REPLY_TOKEN_RESERVE = 500
+
+
+def _estimate_call_tokens(persona: Persona, conversation: List[Dict], user_message: str) -> int:
+    """Tokens to reserve for a Bedrock call: system prompt, history and message plus a reply allowance"""
+    system = estimate_tokens(persona.static_prompt)
+    if BEDROCK_PROMPT_CACHE:
+        system = int(system * CACHE_READ_TOKEN_WEIGHT)
+    history = sum(message_tokens(m) for m in select_history(conversation))
+    return system + history + estimate_tokens(user_message) + REPLY_TOKEN_RESERVE
+
+
+def _queue_key(http_request: Request, session_id: Optional[str]) -> str:
+    """Fairness key for the budget queue: the session, or the client IP for a first message"""
+    return session_id or _client_ip(http_request)
+
+
+async def _acquire_budget(scheduler: TokenScheduler, queue_key: str, tokens: int):
+    """Wait for token budget; 429 when the queue is full, 503 when the wait runs out"""
+    try:
+        with stage("queue"):
+            await scheduler.acquire(queue_key, tokens)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429 if e.queue_full else 503,
+            detail="Too many requests. Please try again later." if e.queue_full
+            else "Service temporarily unavailable due to high demand. Please try again shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
         )
-    else:
-        # Local file storage
-        os.makedirs(MEMORY_DIR, exist_ok=True)
-        file_path = os.path.join(MEMORY_DIR, get_memory_path(session_id))
-        with open(file_path, "w") as f:
-            json.dump(messages, f, indent=2)
-
-
-def call_bedrock(conversation: List[Dict], user_message: str) -> str:
-    """Call AWS Bedrock with conversation history"""
-
-    # Build messages in Bedrock format (alternating user/assistant)
-    messages = []
-    for msg in conversation[-20:]:
-        messages.append({
-            "role": msg["role"],
-            "content": [{"text": msg["content"]}]
-        })
-    messages.append({
-        "role": "user",
-        "content": [{"text": user_message}]
-    })
+
+
+async def _scheduled_bedrock_call(
+    persona: Persona, queue_key: str, conversation: List[Dict], user_message: str
+) -> Tuple[str, int, Optional[str]]:
+    """Reserve the persona's budget, call Bedrock and settle the reservation with the actual usage"""
+    scheduler = _limits_for(persona.id).scheduler
+    reserved = _estimate_call_tokens(persona, conversation, user_message)
+    await _acquire_budget(scheduler, queue_key, reserved)
+    try:
+        with stage("bedrock"):
+            text, tokens_used, stop_reason = await run_bedrock(call_bedrock, persona, conversation, user_message)
+    except Exception:
+        scheduler.reconcile(reserved, 0)
+        raise
+    scheduler.reconcile(reserved, tokens_used)
+    tokens_per_request.observe(tokens_used)
+    return text, tokens_used, stop_reason
+
+
+def call_bedrock(persona: Persona, conversation: List[Dict], user_message: str) -> Tuple[str, int, Optional[str]]:
+    """Call AWS Bedrock with conversation history; returns (text, tokens used, stop reason)"""
+    messages = build_messages(conversation, user_message)
 
     try:
-        response = bedrock_client.converse(
+        response = get_bedrock_client().converse(
             modelId=BEDROCK_MODEL_ID,
             messages=messages,
-            system=[{"text": prompt()}],
-            inferenceConfig={
-                "maxTokens": 2000,
-                "temperature": 0.3,
-                "topP": 0.9
-            }
+            system=persona.system_blocks(BEDROCK_PROMPT_CACHE),
+            inferenceConfig=INFERENCE_CONFIG,
         )
-        text = response["output"]["message"]["content"][0]["text"]
-        tokens_used = response.get("usage", {}).get("totalTokens", 0)
-        return text, tokens_used
+        text = "".join(block.get("text", "") for block in response["output"]["message"]["content"])
+        tokens_used = _usage_tokens(response.get("usage", {}))
+        return text, tokens_used, response.get("stopReason")
 
     except ClientError as e:
         error_code = e.response['Error']['Code']
@@ -198,6 +511,103 @@ def call_bedrock(conversation: List[Dict], user_message: str) -> str:
         raise HTTPException(status_code=500, detail=f"Bedrock error: {str(e)}")
 
 
+async def call_bedrock_stream(persona: Persona, conversation: List[Dict], user_message: str) -> AsyncIterator[Dict]:
+    """
+    Call AWS Bedrock with the streaming API.
+    Yields {"text": delta} for each chunk, {"stop": reason} when the message ends,
+    then a final {"usage": tokens_used}.
+    """
+    messages = build_messages(conversation, user_message)
+
+    response = await run_bedrock(
+        get_bedrock_client().converse_stream,
+        modelId=BEDROCK_MODEL_ID,
+        messages=messages,
+        system=persona.system_blocks(BEDROCK_PROMPT_CACHE),
+        inferenceConfig=INFERENCE_CONFIG,
+    )
+    # Each read from the event stream blocks on the socket, so pull it from the pool
+    stream = iter(response["stream"])
+    try:
+        while True:
+            event = await run_bedrock(next, stream, None)
+            if event is None:
+                break
+            if "contentBlockDelta" in event:
+                text = event["contentBlockDelta"]["delta"].get("text", "")
+                if text:
+                    yield {"text": text}
+            elif "messageStop" in event:
+                yield {"stop": event["messageStop"].get("stopReason")}
+            elif "metadata" in event:
+                yield {"usage": _usage_tokens(event["metadata"].get("usage", {}))}
+    finally:
+        # Hands the pooled HTTP connection back even when the consumer stops early
+        response["stream"].close()
+
+
+def _resolve_session_id(session_id: Optional[str]) -> str:
+    """Validate the client session ID or generate a new one"""
+    if session_id:
+        try:
+            uuid.UUID(session_id, version=4)
+            return session_id
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid session ID format")
+    return str(uuid.uuid4())
+
+
+def _turn_messages(user_message: str, assistant_response: str) -> List[Dict]:
+    """Build the messages stored for one user/assistant exchange"""
+    return [
+        {
+            "role": "user",
+            "content": user_message,
+            "timestamp": datetime.now().isoformat(),
+            "tokens": estimate_tokens(user_message),
+        },
+        {
+            "role": "assistant",
+            "content": assistant_response,
+            "timestamp": datetime.now().isoformat(),
+            "tokens": estimate_tokens(assistant_response),
+        },
+    ]
+
+
+def _sse(event: str, data: Dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Pay the first request's setup costs ahead of time (lambda_handler warm-up events):
+    resources and prompt, AWS clients, and one pooled TLS connection per upstream.
+    Returns the milliseconds spent on each step.
+    """
+    from botocore.exceptions import BotoCoreError
+
+    steps = {
+        "prompt": lambda: persona_cache.get(DEFAULT_PERSONA).system_blocks(),
+        # A cheap read opens the connection; its result (or access error) doesn't matter
+        "bedrock": lambda: get_bedrock_client().list_async_invokes(maxResults=1),
+        "s3": lambda: get_s3_client().head_bucket(Bucket=S3_BUCKET) if USE_S3 else None,
+        "limiter": limiter_backend.warm_up,
+    }
+    timings = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        try:
+            step()
+        except ClientError:
+            pass
+        except BotoCoreError as e:
+            print(f"Warm-up step {name} failed: {e}")
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    return timings
+
+
 @app.get("/")
 async def root():
     return {"status": "ok"}
@@ -208,11 +618,52 @@ async def health_check():
     return {"status": "ok"}
 
 
+def _collect_metrics():
+    """Counters kept by the caches, the limiter and the budget queue, read at scrape time"""
+    for cache, stats in (
+        ("session", session_cache.stats()),
+        ("response", response_cache.stats()),
+        ("semantic", semantic_reply_cache.stats() if semantic_reply_cache is not None else None),
+    ):
+        if stats is None:
+            continue
+        yield "twin_cache_hits_total", "counter", "Cache hits", {"cache": cache}, stats["hits"]
+        yield "twin_cache_misses_total", "counter", "Cache misses", {"cache": cache}, stats["misses"]
+    flights = bedrock_flights.stats()
+    yield "twin_bedrock_calls_total", "counter", "Bedrock calls started by /chat", {}, flights["calls"]
+    yield "twin_bedrock_coalesced_total", "counter", "Requests that joined an identical call in flight", {}, flights["coalesced"]
+    for persona_id, limits in list(_persona_limits.items()):
+        queue = limits.scheduler.stats()
+        labels = {"persona": persona_id}
+        yield "twin_budget_queued_total", "counter", "Requests that waited for token budget", labels, queue["queued"]
+        yield "twin_budget_shed_total", "counter", "Requests turned away for lack of budget", {**labels, "reason": "queue_full"}, queue["shed"]
+        yield "twin_budget_shed_total", "counter", "Requests turned away for lack of budget", {**labels, "reason": "timeout"}, queue["timeouts"]
+        yield "twin_budget_waiting", "gauge", "Requests waiting for token budget", labels, queue["waiting"]
+        yield "twin_budget_backend_errors_total", "counter", "Budget syncs that failed open", labels, limits.scheduler.budget.backend_errors
+        yield "twin_rate_limiter_keys", "gauge", "Client keys tracked by the rate limiter", labels, len(limits.rate_limiter)
+    personas = persona_cache.stats()
+    yield "twin_cache_hits_total", "counter", "Cache hits", {"cache": "persona"}, personas["hits"]
+    yield "twin_cache_misses_total", "counter", "Cache misses", {"cache": "persona"}, personas["misses"]
+    yield "twin_personas_loaded", "gauge", "Persona bundles held in memory besides the default", {}, personas["personas"]
+
+
+registry.collector(_collect_metrics)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of latency, token and cache metrics"""
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request, background_tasks: BackgroundTasks):
+    persona = await _resolve_persona(request.persona_id, http_request)
+    _check_rate_limit(persona.id, http_request)
     try:
         # Validate and sanitize user input
-        is_valid, error_msg, sanitized_message = validate_message(request.message)
+        with stage("validate"):
+            is_valid, error_msg, sanitized_message = validate_message(request.message)
         if not is_valid:
             return ChatResponse(
                 response=error_msg,
@@ -220,43 +671,36 @@ async def chat(request: ChatRequest):
             )
 
         # Validate and generate session ID
-        if request.session_id:
-            try:
-                uuid.UUID(request.session_id, version=4)
-                session_id = request.session_id
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid session ID format")
-        else:
-            session_id = str(uuid.uuid4())
-
-        # Load conversation history
-        conversation = load_conversation(session_id)
+        session_id = _resolve_session_id(request.session_id)
 
-        # Check token budget before calling Bedrock
-        if not _within_token_budget():
-            return ChatResponse(
-                response="Service temporarily unavailable due to high demand. Please try again in a minute.",
-                session_id=session_id
-            )
+        # Load the recent conversation history
+        conversation, stored = await _load_recent(session_id)
 
-        # Call Bedrock for response
-        assistant_response, tokens_used = call_bedrock(conversation, sanitized_message)
-        _record_tokens(tokens_used)
+        # Repeated first-turn questions are answered from the response cache
+        cache_key = _response_cache_key(persona, sanitized_message, stored)
+        assistant_response = _cached_reply(persona, sanitized_message, cache_key)
 
-        # Update conversation history
-        conversation.append(
-            {"role": "user", "content": sanitized_message, "timestamp": datetime.now().isoformat()}
-        )
-        conversation.append(
-            {
-                "role": "assistant",
-                "content": assistant_response,
-                "timestamp": datetime.now().isoformat(),
-            }
-        )
-
-        # Save conversation
-        save_conversation(session_id, conversation)
+        if assistant_response is None:
+            # Call Bedrock once token budget is available, joining an identical call
+            # already in flight (its tokens are charged once, to the request that made it)
+            queue_key = _queue_key(http_request, request.session_id)
+            try:
+                (assistant_response, _, stop_reason), shared = await bedrock_flights.do(
+                    _prompt_key(persona, conversation, sanitized_message),
+                    lambda: _scheduled_bedrock_call(persona, queue_key, conversation, sanitized_message),
+                )
+            except TimeoutError:
+                raise HTTPException(status_code=504, detail="Timed out waiting for the model response")
+            if not shared:
+                _remember_reply(persona, sanitized_message, cache_key, assistant_response, stop_reason)
+
+        # Append the new turn to the conversation history, after the response
+        # when the session cache can serve the next turn in the meantime
+        turn = _turn_messages(sanitized_message, assistant_response)
+        if session_cache.max_bytes:
+            background_tasks.add_task(_save_turn, session_id, conversation, stored, turn)
+        else:
+            await _save_turn(session_id, conversation, stored, turn)
 
         return ChatResponse(response=assistant_response, session_id=session_id)
 
@@ -267,18 +711,188 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _stream_chat_events(
+    persona: Persona, session_id: str, conversation: List[Dict], stored: int, user_message: str,
+    cache_key: Optional[str], reservation: Reservation,
+) -> AsyncIterator[str]:
+    """Relay Bedrock deltas as SSE, then settle the token reservation and save the finished turn"""
+    yield _sse("session", {"session_id": session_id})
+
+    chunks = []
+    stop_reason = None
+    # A reply cut short keeps its reservation, since the tokens were still generated
+    tokens_used = reservation.tokens
+    try:
+        with stage("bedrock_stream"):
+            async for event in call_bedrock_stream(persona, conversation, user_message):
+                if "text" in event:
+                    chunks.append(event["text"])
+                    yield _sse("delta", {"text": event["text"]})
+                elif "stop" in event:
+                    stop_reason = event["stop"]
+                elif "usage" in event:
+                    tokens_used = event["usage"]
+    except ClientError as e:
+        if not chunks:
+            tokens_used = 0
+        print(f"Bedrock stream error ({e.response['Error']['Code']}): {e}")
+        yield _sse("error", {"detail": "Bedrock error"})
+        return
+    except Exception as e:
+        print(f"Error in chat stream: {str(e)}")
+        yield _sse("error", {"detail": "Internal error"})
+        return
+    finally:
+        reservation.settle(tokens_used)
+
+    tokens_per_request.observe(tokens_used)
+    assistant_response = "".join(chunks)
+    _remember_reply(persona, user_message, cache_key, assistant_response, stop_reason)
+
+    # Persist the turn once the full reply has been streamed, but before the last send:
+    # a client leaving while "done" is pending closes this generator at that yield
+    flush = _save_turn_behind(session_id, conversation, stored, _turn_messages(user_message, assistant_response))
+    yield _sse("done", {"session_id": session_id})
+    await flush
+
+
+async def _settle_stream(events: AsyncGenerator[str, None], reservation: Reservation):
+    """
+    After a streamed response: the generator settles the reservation itself, but a client
+    that left while it waited on a send leaves it suspended, and one that left before the
+    body started leaves it unstarted. Closing it runs its cleanup in the first case; in the
+    second nothing was generated and the tokens go back.
+    """
+    await events.aclose()
+    reservation.settle(0)
+
+
+async def _cached_reply_events(
+    session_id: str, conversation: List[Dict], stored: int, user_message: str, assistant_response: str
+) -> AsyncIterator[str]:
+    """Send a reply from the response cache as a single delta, then save the turn"""
+    yield _sse("session", {"session_id": session_id})
+    flush = _save_turn_behind(session_id, conversation, stored, _turn_messages(user_message, assistant_response))
+    yield _sse("delta", {"text": assistant_response})
+    yield _sse("done", {"session_id": session_id})
+    await flush
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """Stream the assistant reply as server-sent events (session, delta..., done)"""
+    persona = await _resolve_persona(request.persona_id, http_request)
+    _check_rate_limit(persona.id, http_request)
+    with stage("validate"):
+        is_valid, error_msg, sanitized_message = validate_message(request.message)
+    if not is_valid:
+        session_id = request.session_id or str(uuid.uuid4())
+        events = [
+            _sse("session", {"session_id": session_id}),
+            _sse("delta", {"text": error_msg}),
+            _sse("done", {"session_id": session_id}),
+        ]
+        return StreamingResponse(iter(events), media_type="text/event-stream")
+
+    session_id = _resolve_session_id(request.session_id)
+
+    try:
+        conversation, stored = await _load_recent(session_id)
+    except Exception as e:
+        print(f"Error in chat stream: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    cache_key = _response_cache_key(persona, sanitized_message, stored)
+    cached_response = _cached_reply(persona, sanitized_message, cache_key)
+    if cached_response is not None:
+        return StreamingResponse(
+            _cached_reply_events(session_id, conversation, stored, sanitized_message, cached_response),
+            media_type="text/event-stream",
+        )
+
+    # Wait for token budget before the stream starts, so overload gets a proper status code
+    scheduler = _limits_for(persona.id).scheduler
+    reserved = _estimate_call_tokens(persona, conversation, sanitized_message)
+    await _acquire_budget(scheduler, _queue_key(http_request, request.session_id), reserved)
+    reservation = Reservation(scheduler, reserved)
+
+    events = _stream_chat_events(persona, session_id, conversation, stored, sanitized_message, cache_key, reservation)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(_settle_stream, events, reservation),
+    )
+
+
+_ETAG = re.compile(r'^(?:W/)?"c(\d+)"$')
+
+
+def _conversation_etag(count: int) -> str:
+    # Stored messages never change, so the count identifies the history (and any page of it)
+    return f'"c{count}"'
+
+
+def _known_count(if_none_match: Optional[str]) -> Optional[int]:
+    """The message count named by an If-None-Match header from an earlier response"""
+    for tag in (if_none_match or "").split(","):
+        match = _ETAG.match(tag.strip())
+        if match:
+            return int(match.group(1))
+    return None
+
+
 @app.get("/conversation/{session_id}")
-async def get_conversation(session_id: str):
-    """Retrieve conversation history"""
+async def get_conversation(
+    session_id: str,
+    request: Request,
+    response: Response,
+    tail: Optional[int] = Query(None, ge=1, le=CONVERSATION_PAGE_MAX),
+    before: Optional[int] = Query(None, ge=0),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=CONVERSATION_PAGE_MAX),
+):
+    """Retrieve conversation history, or a page of it
+
+    Messages are numbered from 0 and never move, so start/end in a response are stable
+    cursors: tail=N gives the latest N messages, before={start}&tail=N the N before a
+    page, offset={end}&limit=N the N after it. Without tail or limit a page holds
+    CONVERSATION_PAGE_SIZE messages: the latest ones, or those from offset on. Every
+    response is bounded by CONVERSATION_PAGE_MAX; page through total for the full history.
+    A matching If-None-Match is answered with 304 before any message is read.
+    """
     try:
         uuid.UUID(session_id, version=4)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid session ID format")
+    if tail is not None and limit is not None:
+        raise HTTPException(status_code=400, detail="Use either tail or limit")
+    if tail is None and limit is None:
+        page = min(CONVERSATION_PAGE_SIZE, CONVERSATION_PAGE_MAX)
+        if offset:
+            limit = page
+        else:
+            tail = page
+    end = offset + limit if limit is not None else None
+    if before is not None:
+        end = before if end is None else min(end, before)
     try:
-        conversation = load_conversation(session_id)
-        return {"session_id": session_id, "messages": conversation}
+        await _wait_for_flush(session_id)
+        conversation, count = await run_s3(
+            load_conversation_range, session_id, offset, end, tail,
+            _known_count(request.headers.get("if-none-match")),
+        )
+    except NotModified as e:
+        return Response(
+            status_code=304, headers={"ETag": _conversation_etag(e.count), "Cache-Control": "no-cache"}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    first, last = window(count, offset, end, tail)
+    response.headers["ETag"] = _conversation_etag(count)
+    response.headers["Cache-Control"] = "no-cache"
+    messages = [{k: v for k, v in m.items() if k != "tokens"} for m in conversation]
+    return {"session_id": session_id, "messages": messages, "total": count, "start": first, "end": last}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+"""
+In-process cache of recent conversation tails
+Lets a warm instance skip the storage read for sessions it served last.
+Bounded by an estimate of retained bytes, with least recently used eviction.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Byte budget for cached conversations (0 disables the cache)
+SESSION_CACHE_BYTES = int(os.environ.get("SESSION_CACHE_BYTES", str(8 * 1024 * 1024)))
+
+# Rough per-message overhead of the dicts and timestamp strings
+_MESSAGE_OVERHEAD = 400
+
+
+def _size(messages: List[Dict]) -> int:
+    return sum(len(m["content"]) + _MESSAGE_OVERHEAD for m in messages)
+
+
+class SessionCache:
+    """
+    Maps session_id to (messages tail, stored message count).
+    The stored count is the version the tail corresponds to; writers use it to
+    detect that another instance appended to the session in the meantime.
+    """
+
+    def __init__(self, max_bytes: int = SESSION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[List[Dict], int, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[Tuple[List[Dict], int]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            # Copy so callers can't mutate the cached tail
+            return list(entry[0]), entry[1]
+
+    def put(self, session_id: str, messages: List[Dict], count: int):
+        size = _size(messages)
+        with self._lock:
+            self._remove(session_id)
+            if size > self.max_bytes:
+                return
+            self._entries[session_id] = (list(messages), count, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,64 @@
+"""
+Single-flight deduplication of identical in-flight calls
+Concurrent callers with the same key share one execution: the first caller
+starts the call and the others wait for its result (or its exception).
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+# Seconds a coalesced caller waits for the shared call before giving up
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get("SINGLE_FLIGHT_TIMEOUT", "60"))
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, timeout: float = SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run fn() once for all concurrent callers with this key.
+        Returns (result, shared); shared is False only for the caller that ran it.
+        Waiting callers raise TimeoutError after `timeout` seconds.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.calls += 1
+
+        # Shielded so a caller that goes away doesn't cancel the call for the others
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), self.timeout if shared else None)
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        return result, shared
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception so it isn't reported as unhandled when every caller left
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "in_flight": len(self._calls),
+        }
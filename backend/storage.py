@@ -0,0 +1,356 @@
+"""
+Append-only conversation storage
+Each turn appends only its new messages instead of rewriting the session.
+
+Local (MEMORY_DIR):  {session_id}.jsonl, one message per line
+S3 (S3_BUCKET):      {session_id}/turns/{start:08d}-{end:08d}.twr per turn, periodically
+                     compacted into {session_id}/chunks/{start:08d}-{end:08d}.twr
+Messages are numbered from 0 in storage order and never move, so a range of them
+is read from the objects that cover it without decoding the rest of the session.
+Records use the compact format in conversation_codec, hence the .twr suffix; plain
+JSON objects and lines written by earlier versions, turn and chunk objects with a
+.json suffix, sessions saved as a single {session_id}.json array, and
+{session_id}/snapshot-{count:08d}.json snapshots (messages 0 to count) stay readable.
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+import conversation_codec
+
+# Fold turn objects into a chunk once this many messages have accumulated
+COMPACT_EVERY = int(os.environ.get("CONVERSATION_COMPACT_EVERY", "40"))
+
+# Turn objects of one read are fetched in parallel
+_fetch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="s3-fetch")
+
+# Binary records are written as .twr; .json keys are from earlier versions
+_TURN_KEY = re.compile(r"/turns/(\d+)-(\d+)\.(?:twr|json)$")
+_CHUNK_KEY = re.compile(r"/chunks/(\d+)-(\d+)\.(?:twr|json)$")
+_SNAPSHOT_KEY = re.compile(r"/snapshot-(\d+)\.json$")
+
+
+class ConflictError(Exception):
+    """Another writer already stored messages at this position"""
+
+
+class NotModified(Exception):
+    """The session still holds the message count the caller already has"""
+
+    def __init__(self, count: int):
+        super().__init__(count)
+        self.count = count
+
+
+def window(count: int, start: int = 0, end: Optional[int] = None, tail: Optional[int] = None) -> Tuple[int, int]:
+    """Bounds [first, last) of messages start..end of a session holding count, narrowed to the last `tail`"""
+    last = count if end is None else min(end, count)
+    first = min(start, last)
+    if tail:
+        first = max(first, last - tail)
+    return first, last
+
+
+def _is_missing(e: ClientError) -> bool:
+    return e.response["Error"]["Code"] in ("NoSuchKey", "404")
+
+
+class LocalStore:
+    """JSON Lines files under a local directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def _legacy_path(self, session_id: str) -> str:
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def load(self, session_id: str, tail: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Return (messages, total message count); with tail, only the last `tail` messages"""
+        return self.load_range(session_id, tail=tail)
+
+    def load_range(
+        self,
+        session_id: str,
+        start: int = 0,
+        end: Optional[int] = None,
+        tail: Optional[int] = None,
+        known_count: Optional[int] = None,
+    ) -> Tuple[List[Dict], int]:
+        """Return (messages start..end, or their last `tail`, total message count)
+
+        Raises NotModified, without decoding any message, when the session holds known_count messages.
+        """
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            legacy = self._legacy_path(session_id)
+            if not os.path.exists(legacy):
+                messages = []
+            else:
+                with open(legacy, "r", encoding="utf-8") as f:
+                    messages = json.load(f)
+            if len(messages) == known_count:
+                raise NotModified(known_count)
+            first, last = window(len(messages), start, end, tail)
+            return messages[first:last], len(messages)
+
+        with open(path, "rb") as f:
+            if tail and start == 0 and end is None:
+                # The latest messages: scan back from the end, then count lines without decoding them
+                lines = _read_tail_lines(f, tail)
+                f.seek(0)
+                count = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 16), b""))
+                if count == known_count:
+                    raise NotModified(count)
+                return [conversation_codec.decode_line(line) for line in lines], count
+            lines = [line for line in f.read().splitlines() if line]
+        if len(lines) == known_count:
+            raise NotModified(known_count)
+        first, last = window(len(lines), start, end, tail)
+        return [conversation_codec.decode_line(line) for line in lines[first:last]], len(lines)
+
+    def append(self, session_id: str, messages: List[Dict], start: int):
+        """Append messages that follow the `start` messages already stored"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(session_id)
+        legacy = self._legacy_path(session_id)
+        if not os.path.exists(path) and os.path.exists(legacy):
+            # Migrate a session saved as a single JSON array
+            with open(legacy, "r", encoding="utf-8") as f:
+                messages = json.load(f)[:start] + messages
+            self._write_lines(path, messages, "w")
+            os.remove(legacy)
+            return
+        self._write_lines(path, messages, "a")
+
+    @staticmethod
+    def _write_lines(path: str, messages: List[Dict], mode: str):
+        with open(path, mode, encoding="utf-8") as f:
+            f.write("".join(conversation_codec.encode_line(m) + "\n" for m in messages))
+
+
+def _identity(messages: List[Dict]) -> List[Tuple]:
+    return [(m.get("role"), m.get("timestamp"), m.get("content")) for m in messages]
+
+
+def _read_tail_lines(f, n: int, block_size: int = 8192) -> List[bytes]:
+    """Read the last n non-empty lines of a binary file by scanning backwards"""
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    data = b""
+    while position > 0 and data.count(b"\n") <= n:
+        step = min(block_size, position)
+        position -= step
+        f.seek(position)
+        data = f.read(step) + data
+    lines = [line for line in data.splitlines() if line]
+    return lines[-n:] if n else []
+
+
+class S3Store:
+    """Per-turn objects with periodic snapshot compaction in an S3 bucket"""
+
+    def __init__(self, bucket: str, client: Callable):
+        self.bucket = bucket
+        # Called for every request so the client can be created lazily
+        self._client = client
+
+    def _list(self, session_id: str) -> List[Tuple[int, int, str]]:
+        """Stored turn, chunk and snapshot objects as (start, end, key), sorted"""
+        parts = []
+        paginator = self._client().get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{session_id}/"):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                match = _TURN_KEY.search(key) or _CHUNK_KEY.search(key)
+                if match:
+                    parts.append((int(match.group(1)), int(match.group(2)), key))
+                    continue
+                match = _SNAPSHOT_KEY.search(key)
+                if match:
+                    parts.append((0, int(match.group(1)), key))
+        return sorted(parts)
+
+    def _chain(self, session_id: str, parts: List[Tuple[int, int, str]]) -> List[Tuple[int, int, str]]:
+        """The objects that cover the session end to end, in order
+
+        At each position the part reaching furthest wins, so turns already folded into a
+        chunk (or an older snapshot) are skipped. Messages before the first part come
+        from a legacy single-file session.
+        """
+        furthest: Dict[int, Tuple[int, int, str]] = {}
+        for part in parts:
+            if part[0] not in furthest or part[1] > furthest[part[0]][1]:
+                furthest[part[0]] = part
+        if not furthest:
+            return []
+        position = min(furthest)
+        chain = [(0, position, f"{session_id}.json")] if position > 0 else []
+        while position in furthest:
+            chain.append(furthest[position])
+            position = furthest[position][1]
+        return chain
+
+    def _read(self, chain: List[Tuple[int, int, str]]) -> Optional[List[Dict]]:
+        """The messages of consecutive parts, fetched in parallel; None if one has disappeared"""
+        messages: List[Dict] = []
+        for (start, end, _), part in zip(chain, _fetch_executor.map(self._get, [key for _, _, key in chain])):
+            if part is None:
+                return None
+            messages.extend(part[: end - start])
+        return messages
+
+    def _get(self, key: str) -> Optional[List[Dict]]:
+        try:
+            response = self._client().get_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if _is_missing(e):
+                return None
+            raise
+        return conversation_codec.decode(response["Body"].read())
+
+    def load(self, session_id: str, tail: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """Return (messages, total message count); with tail, only the last `tail` messages"""
+        return self.load_range(session_id, tail=tail)
+
+    def load_range(
+        self,
+        session_id: str,
+        start: int = 0,
+        end: Optional[int] = None,
+        tail: Optional[int] = None,
+        known_count: Optional[int] = None,
+    ) -> Tuple[List[Dict], int]:
+        """Return (messages start..end, or their last `tail`, total message count)
+
+        Only the objects overlapping the range are fetched. Raises NotModified after the
+        listing alone when the session holds known_count messages.
+        """
+        # A compaction can delete turn objects between listing and reading; list again if so
+        for _ in range(3):
+            result = self._load(session_id, start, end, tail, known_count)
+            if result is not None:
+                return result
+        raise RuntimeError(f"Conversation {session_id} changed while loading")
+
+    def _load(
+        self, session_id: str, start: int, end: Optional[int], tail: Optional[int], known_count: Optional[int]
+    ) -> Optional[Tuple[List[Dict], int]]:
+        chain = self._chain(session_id, self._list(session_id))
+        if not chain:
+            legacy = self._get(f"{session_id}.json") or []
+            if len(legacy) == known_count:
+                raise NotModified(known_count)
+            first, last = window(len(legacy), start, end, tail)
+            return legacy[first:last], len(legacy)
+
+        count = chain[-1][1]
+        if count == known_count:
+            raise NotModified(count)
+        first, last = window(count, start, end, tail)
+        needed = [part for part in chain if part[1] > first and part[0] < last]
+        if not needed:
+            return [], count
+        messages = self._read(needed)
+        if messages is None:
+            return None
+        offset = needed[0][0]
+        return messages[first - offset : last - offset], count
+
+    def append(self, session_id: str, messages: List[Dict], start: int):
+        """Store messages that follow the `start` messages already stored as one turn object
+
+        Raises ConflictError unless the session holds exactly `start` messages. The turn
+        key alone can't detect this: a stale writer's key may already have been folded
+        into a chunk and deleted, and a writer past the end would leave a gap that a
+        later turn gets spliced into.
+        """
+        end = start + len(messages)
+        stored = self._count(session_id)
+        if stored != start:
+            raise ConflictError(f"{session_id} holds {stored} messages, not {start}")
+        key = f"{session_id}/turns/{start:08d}-{end:08d}.twr"
+        try:
+            # Conditional write: never replace a turn another instance stored at this position
+            self._client().put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=conversation_codec.encode(messages),
+                ContentType="application/octet-stream",
+                IfNoneMatch="*",
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict"):
+                raise ConflictError(f"{session_id} already has messages at {start}") from e
+            raise
+        if not self._landed(session_id, (start, end, key), messages):
+            # Another writer's turn at this position was folded into a chunk between the
+            # check and the write, so this one would never be read
+            self._client().delete_objects(Bucket=self.bucket, Delete={"Objects": [{"Key": key}], "Quiet": True})
+            raise ConflictError(f"{session_id} already has messages at {start}")
+        if end // COMPACT_EVERY > start // COMPACT_EVERY:
+            self.compact(session_id)
+
+    def _count(self, session_id: str) -> int:
+        chain = self._chain(session_id, self._list(session_id))
+        if chain:
+            return chain[-1][1]
+        return len(self._get(f"{session_id}.json") or [])
+
+    def _landed(self, session_id: str, turn: Tuple[int, int, str], messages: List[Dict]) -> bool:
+        """Whether a turn just written is part of the session as read back"""
+        chain = self._chain(session_id, self._list(session_id))
+        if turn in chain:
+            return True
+        start, end, _ = turn
+        for part_start, part_end, key in chain:
+            if part_start <= start and end <= part_end:
+                # Folded into a chunk already: by this compaction or, with other messages, by a rival's
+                folded = self._get(key)
+                if folded is None:
+                    return False
+                return _identity(folded[start - part_start : end - part_start]) == _identity(messages)
+        return False
+
+    def compact(self, session_id: str):
+        """Fold the turn objects after the last chunk into a new chunk and delete what it replaces
+
+        Earlier chunks are never rewritten, so a compaction reads and writes only the
+        messages since the previous one.
+        """
+        chain = self._chain(session_id, self._list(session_id))
+        folded = []
+        for part in reversed(chain):
+            if _CHUNK_KEY.search(part[2]) or _SNAPSHOT_KEY.search(part[2]):
+                break
+            folded.insert(0, part)
+        if not folded:
+            return
+        messages = self._read(folded)
+        if messages is None:
+            # A concurrent compaction got there first
+            return
+        start, end = folded[0][0], folded[-1][1]
+        self._client().put_object(
+            Bucket=self.bucket,
+            Key=f"{session_id}/chunks/{start:08d}-{end:08d}.twr",
+            Body=conversation_codec.encode(messages),
+            ContentType="application/octet-stream",
+        )
+        # Everything the chain no longer reads can go, including a legacy single-file session
+        parts = self._list(session_id)
+        chain = self._chain(session_id, parts)
+        stale = [part[2] for part in parts if part[1] <= chain[-1][1] and part not in chain]
+        if chain[0][2] != f"{session_id}.json":
+            stale.append(f"{session_id}.json")
+        self._client().delete_objects(
+            Bucket=self.bucket,
+            Delete={"Objects": [{"Key": key} for key in stale], "Quiet": True},
+        )
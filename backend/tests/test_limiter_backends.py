@@ -0,0 +1,89 @@
+"""
+Shared counter backends: the memory, SQLite and DynamoDB backends (the latter on
+FakeDynamoDB with a simulated round trip) count exactly under concurrency, keep
+the expiry set by the first increment, and never let token budgets leasing from
+one counter hold more than the limit.
+"""
+
+import threading
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeDynamoDB
+from ratelimit import DynamoDBBackend, MemoryBackend, SQLiteBackend, TokenBudget
+
+THREADS = 8
+INCREMENTS = 200
+
+
+@pytest.fixture
+def dynamodb_client():
+    return FakeDynamoDB(latency=0.005)
+
+
+@pytest.fixture(params=["memory", "sqlite", "dynamodb"])
+def backend(request, tmp_path, dynamodb_client):
+    if request.param == "memory":
+        backend = MemoryBackend()
+    elif request.param == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "limits.db"))
+    else:
+        backend = DynamoDBBackend("limits", client=dynamodb_client)
+    backend.warm_up()
+    return backend
+
+
+def test_concurrent_increments_add_up(backend):
+    results = []
+
+    def worker():
+        for _ in range(INCREMENTS):
+            results.append(backend.incr("check", 1, 1, 120))
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = THREADS * INCREMENTS
+    # Atomic increments return every value from 1 to total exactly once
+    assert sorted(results) == list(range(1, total + 1))
+    assert backend.incr("check", 1, 0, 120) == total
+    # Each window is a separate counter
+    assert backend.incr("check", 2, 1, 120) == 1
+
+
+def test_budgets_never_lease_over_the_limit(backend, dynamodb_client):
+    limit, instances = 20_000, 4
+    budgets = [TokenBudget(backend, limit, lease_size=3000, key="budget") for _ in range(instances)]
+    barrier = threading.Barrier(instances)
+
+    def worker(budget: TokenBudget):
+        barrier.wait()
+        while budget.reserve(700):
+            pass
+
+    threads = [threading.Thread(target=worker, args=(budget,)) for budget in budgets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    leased = sum(budget._leased for budget in budgets)
+    shared = backend.incr("budget", budgets[0]._index, 0, 120)
+    assert leased <= limit
+    # Anything taken beyond the limit was handed back, so the counter matches the leases
+    assert shared == leased
+    if isinstance(backend, DynamoDBBackend):
+        # Four instances racing over a 5 ms round trip always overshoot somewhere
+        assert dynamodb_client.give_backs
+
+
+def test_later_increments_keep_the_expiry(dynamodb_client):
+    backend = DynamoDBBackend("limits", client=dynamodb_client)
+    backend.incr("ttl", 7, 1, 60)
+    first = dynamodb_client.items["ttl#7"]["expires_at"]
+    assert abs(first - (time.time() + 60)) <= 2
+    time.sleep(1.1)
+    backend.incr("ttl", 7, 1, 60)
+    assert dynamodb_client.items["ttl#7"]["expires_at"] == first
@@ -0,0 +1,85 @@
+"""
+Conflicting appends to S3 conversation storage, replayed on FakeS3: no turn is
+lost or spliced out of order.
+"""
+
+import threading
+import uuid
+
+import pytest
+
+from benchmarks.fakes import FakeS3
+from storage import COMPACT_EVERY, ConflictError, S3Store
+
+
+def turn(start: int, writer: str = "a"):
+    return [
+        {"role": "user", "content": f"{writer} question {start}", "timestamp": f"2025-01-01T00:00:{start % 60:02d}"},
+        {"role": "assistant", "content": f"{writer} answer {start}", "timestamp": f"2025-01-01T00:00:{start % 60:02d}"},
+    ]
+
+
+@pytest.fixture
+def client():
+    return FakeS3()
+
+
+@pytest.fixture
+def store(client):
+    return S3Store("bucket", lambda: client)
+
+
+def test_stale_writer_behind_a_chunk_conflicts(store, client):
+    session_id = str(uuid.uuid4())
+    for start in range(0, COMPACT_EVERY, 2):
+        store.append(session_id, turn(start), start)
+    assert any("/chunks/" in key for _, key in client.objects)
+    with pytest.raises(ConflictError):
+        store.append(session_id, turn(COMPACT_EVERY - 2, "stale"), COMPACT_EVERY - 2)
+    messages, count = store.load(session_id)
+    assert count == COMPACT_EVERY
+    assert messages[-2:] == turn(COMPACT_EVERY - 2)
+
+
+def test_writer_past_the_end_conflicts(store):
+    session_id = str(uuid.uuid4())
+    store.append(session_id, turn(0), 0)
+    # The flush at 2 failed, and the next one still counts it as stored
+    with pytest.raises(ConflictError):
+        store.append(session_id, turn(4), 4)
+    _, count = store.load(session_id)
+    store.append(session_id, turn(4), count)
+    store.append(session_id, turn(count + 2), count + 2)
+    messages, count = store.load(session_id)
+    assert count == 6
+    assert messages == turn(0) + turn(4) + turn(4)
+
+
+def test_racing_writers_keep_every_accepted_turn():
+    # A little latency lets the writers interleave between check and write
+    client = FakeS3(latency=0.001)
+    store = S3Store("bucket", lambda: client)
+    session_id = str(uuid.uuid4())
+    accepted = []
+    lock = threading.Lock()
+
+    def writer(name: str):
+        for _ in range(20):
+            _, start = store.load(session_id, 1)
+            messages = turn(start, name)
+            try:
+                store.append(session_id, messages, start)
+            except ConflictError:
+                continue
+            with lock:
+                accepted.append(messages)
+
+    threads = [threading.Thread(target=writer, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    messages, count = store.load(session_id)
+    stored = [messages[i : i + 2] for i in range(0, count, 2)]
+    assert accepted
+    assert sorted(map(str, stored)) == sorted(map(str, accepted))
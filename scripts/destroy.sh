@@ -71,6 +71,9 @@ if [ ! -f "../backend/lambda-deployment.zip" ]; then
     echo "Creating dummy lambda package for destroy operation..."
     echo "dummy" | zip ../backend/lambda-deployment.zip -
 fi
+if [ ! -f "../backend/lambda-layer.zip" ]; then
+    echo "dummy" | zip ../backend/lambda-layer.zip -
+fi
 
 # Run terraform destroy with auto-approve
 if [ "$ENVIRONMENT" = "prod" ] && [ -f "prod.tfvars" ]; then
@@ -40,6 +40,24 @@ resource "aws_s3_bucket_ownership_controls" "memory" {
   }
 }
 
+# DynamoDB table for rate-limit and token-budget counters shared across Lambda instances
+resource "aws_dynamodb_table" "limits" {
+  name         = "${local.name_prefix}-limits"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+  tags         = local.common_tags
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
 # S3 bucket for frontend static website
 resource "aws_s3_bucket" "frontend" {
   bucket = "${local.name_prefix}-frontend-${data.aws_caller_identity.current.account_id}"
@@ -120,6 +138,32 @@ resource "aws_iam_role_policy_attachment" "lambda_s3" {
   role       = aws_iam_role.lambda_role.name
 }
 
+resource "aws_iam_role_policy" "lambda_limits" {
+  name = "${local.name_prefix}-lambda-limits"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        # DescribeTable lets warm-up open the connection without touching counters
+        Action   = ["dynamodb:UpdateItem", "dynamodb:DescribeTable"]
+        Resource = aws_dynamodb_table.limits.arn
+      },
+    ]
+  })
+}
+
+# Dependencies as a layer, so a code-only deploy uploads only the small function zip
+resource "aws_lambda_layer_version" "dependencies" {
+  filename                 = "${path.module}/../backend/lambda-layer.zip"
+  layer_name               = "${local.name_prefix}-dependencies"
+  source_code_hash         = filebase64sha256("${path.module}/../backend/lambda-layer.zip")
+  compatible_runtimes      = ["python3.12"]
+  compatible_architectures = ["x86_64"]
+}
+
 # Lambda function
 resource "aws_lambda_function" "api" {
   filename         = "${path.module}/../backend/lambda-deployment.zip"
@@ -127,6 +171,7 @@ resource "aws_lambda_function" "api" {
   role             = aws_iam_role.lambda_role.arn
   handler          = "lambda_handler.handler"
   source_code_hash = filebase64sha256("${path.module}/../backend/lambda-deployment.zip")
+  layers           = [aws_lambda_layer_version.dependencies.arn]
   runtime          = "python3.12"
   architectures    = ["x86_64"]
   timeout          = var.lambda_timeout
@@ -143,6 +188,12 @@ resource "aws_lambda_function" "api" {
       USE_S3            = "true"
       S3_BUCKET         = aws_s3_bucket.memory.id
       MEMORY_DIR        = "/tmp/memory"
+      FAST_STARTUP      = "true"
+      IMPORT_PROFILE    = tostring(var.import_profile)
+      LIMITER_BACKEND   = "dynamodb"
+      LIMITER_TABLE     = aws_dynamodb_table.limits.name
+      # Metrics go to CloudWatch as EMF log lines; /metrics is per container and not routed
+      METRICS_EMF       = "true"
     }
   }
 
@@ -196,6 +247,14 @@ resource "aws_apigatewayv2_route" "post_chat" {
   target    = "integrations/${aws_apigatewayv2_integration.lambda.id}"
 }
 
+# API Gateway buffers Lambda proxy responses, so the stream arrives in one piece
+# behind it; deltas are delivered incrementally when served directly (uvicorn)
+resource "aws_apigatewayv2_route" "post_chat_stream" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "POST /chat/stream"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda.id}"
+}
+
 resource "aws_apigatewayv2_route" "get_health" {
   api_id    = aws_apigatewayv2_api.main.id
   route_key = "GET /health"
@@ -211,6 +270,42 @@ resource "aws_lambda_permission" "api_gw" {
   source_arn    = "${aws_apigatewayv2_api.main.execution_arn}/*/*"
 }
 
+# Keep-alive: the handler answers {"warmup": true} itself, loading the app and
+# opening the Bedrock, S3 and DynamoDB connections in a fresh container
+resource "aws_cloudwatch_event_rule" "warmup" {
+  count               = var.warmup_schedule == "" ? 0 : 1
+  name                = "${local.name_prefix}-warmup"
+  schedule_expression = var.warmup_schedule
+  tags                = local.common_tags
+}
+
+resource "aws_cloudwatch_event_target" "warmup" {
+  count = var.warmup_schedule == "" ? 0 : 1
+  rule  = aws_cloudwatch_event_rule.warmup[0].name
+  arn   = aws_lambda_function.api.arn
+  input = jsonencode({ warmup = true })
+}
+
+resource "aws_lambda_permission" "warmup" {
+  count         = var.warmup_schedule == "" ? 0 : 1
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.api.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.warmup[0].arn
+}
+
+# Cold vs warm invocations by kind (request, health, warmup), from the handler's log lines
+resource "aws_cloudwatch_query_definition" "invocations" {
+  name            = "${local.name_prefix}/cold-vs-warm"
+  log_group_names = ["/aws/lambda/${aws_lambda_function.api.function_name}"]
+  query_string    = <<-EOT
+    filter event = "invocation"
+    | stats count(*) as invocations, avg(duration_ms) as avg_ms, pct(duration_ms, 95) as p95_ms by kind, cold, init_type
+    | sort kind, cold
+  EOT
+}
+
 # CloudFront security response headers policy
 resource "aws_cloudfront_response_headers_policy" "security_headers" {
   name    = "${local.name_prefix}-security-headers"
@@ -47,6 +47,18 @@ variable "api_throttle_rate_limit" {
   default     = 2
 }
 
+variable "warmup_schedule" {
+  description = "EventBridge schedule that keeps a Lambda container warm, e.g. rate(5 minutes); empty disables it"
+  type        = string
+  default     = "rate(5 minutes)"
+}
+
+variable "import_profile" {
+  description = "Log per-module import times on cold starts; enable while investigating init time"
+  type        = bool
+  default     = false
+}
+
 variable "use_custom_domain" {
   description = "Attach a custom domain to CloudFront"
   type        = bool